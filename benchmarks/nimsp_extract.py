@@ -0,0 +1,133 @@
+"""Throughput of the NIMSP extractor against the local stand-in of the API.
+
+Runs cf_etl.nimsp.extract against a stand-in served from another process,
+once for every number of workers given, and reports pages/sec, records/sec
+and the peak memory allocated by the extraction.
+
+    python benchmarks/nimsp_extract.py --pages 200 --latency 0.05 -w 1 4 8
+"""
+
+import time
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from io import StringIO
+from pathlib import Path
+from multiprocessing import Process
+
+from cf_etl.nimsp import extract
+from cf_etl.nimsp.api import NIMSPApi
+from stand_in import StandIn
+
+
+def serve(port: int, options: dict):
+    StandIn(**options).serve(port=port)
+
+
+def run(workers: int, rate: float, page_format: str, memory: bool) -> dict:
+    """A single extraction into a throwaway directory"""
+
+    with tempfile.TemporaryDirectory() as export_path:
+        if memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+
+        # The reports printed along the way are not part of the benchmark
+        with (
+            contextlib.redirect_stdout(StringIO()),
+            contextlib.redirect_stderr(StringIO()),
+        ):
+            records = extract.main(
+                "stand-in",
+                ["2024"],
+                Path(export_path),
+                workers=workers,
+                rate=rate,
+                cache_ttl=0,
+                backoff=0.05,
+                page_format=page_format,
+            )
+
+        seconds = time.perf_counter() - start
+
+        peak = None
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    return {"seconds": seconds, "records": len(records), "peak": peak}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(prog="nimsp_extract_benchmark")
+
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--per_page", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--blank_rate", type=float, default=0.0)
+    parser.add_argument(
+        "--server_rate", type=float, default=0.0, help="throttling of the stand-in"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="rate limit of the client"
+    )
+    parser.add_argument("--page_format", default="gzip")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+
+    server = Process(
+        target=serve,
+        args=(
+            args.port,
+            {
+                "pages": args.pages,
+                "per_page": args.per_page,
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "blank_rate": args.blank_rate,
+                "rate": args.server_rate,
+            },
+        ),
+        daemon=True,
+    )
+    server.start()
+    time.sleep(0.5)
+
+    NIMSPApi.URL = f"http://127.0.0.1:{args.port}"
+
+    print(
+        f"{'workers':>8} {'pages/s':>10} {'records/s':>12} "
+        f"{'records':>9} {'peak MiB':>9}"
+    )
+
+    try:
+        for workers in args.workers:
+            # The best of several runs, and a separate run for memory since
+            # tracing allocations slows the extraction down
+            best = min(
+                (
+                    run(workers, args.rate, args.page_format, memory=False)
+                    for _ in range(args.repeat)
+                ),
+                key=lambda r: r["seconds"],
+            )
+            peak = run(workers, args.rate, args.page_format, memory=True)["peak"]
+
+            print(
+                f"{workers:>8} {args.pages / best['seconds']:>10.1f} "
+                f"{best['records'] / best['seconds']:>12.1f} "
+                f"{best['records']:>9} {peak / 1024**2:>9.1f}"
+            )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Scores looked up by BlockScores against scoring every pair as compared.
+
+Builds made up candidates, blocks them by every pass given and compares
+every pair within a block in the order match_blocked hands the blocks over,
+the way the matcher does. Every block must be scored at most once.
+
+    python benchmarks/scoring.py --blocking state_id+lastname:soundex
+"""
+
+import time
+import random
+import argparse
+
+from rapidfuzz import fuzz
+
+from cf_etl.records import RecordBatch
+from cf_etl.blocking import BLOCK, block_keys, parse_blocking
+from cf_etl.scoring import BlockScores, column_pairs
+
+
+STATES = ("AK", "CA", "FL", "NY", "OH", "PA", "TX", "WA")
+FIRSTNAMES = ("john", "mary", "ann", "jose", "li", "david", "robert", "linda")
+
+
+def make_records(rows: int, lastnames: list[str], rng: random.Random):
+    return RecordBatch.from_records(
+        {
+            i: {
+                "firstname": rng.choice(FIRSTNAMES),
+                "lastname": rng.choice(lastnames),
+                "state_id": rng.choice(STATES),
+            }
+            for i in range(rows)
+        }
+    )
+
+
+def compare(x_records: dict, y_records: dict, columns: list[str], scorer) -> int:
+    """Compares every pair of records in the same block, a block at a time"""
+    y_blocks = {}
+    for y_record in y_records.values():
+        y_blocks.setdefault(y_record[BLOCK], []).append(y_record)
+
+    n = 0
+    for x_record in x_records.values():
+        for y_record in y_blocks.get(x_record[BLOCK], ()):
+            for column in columns:
+                scorer(x_record[column], y_record[column])
+                n += 1
+    return n
+
+
+def main():
+
+    parser = argparse.ArgumentParser(prog="scoring_benchmark")
+
+    parser.add_argument("--x_rows", type=int, default=30_000)
+    parser.add_argument("--y_rows", type=int, default=20_000)
+    parser.add_argument(
+        "--blocking",
+        nargs="+",
+        default=["state_id+lastname:soundex", "state_id+lastname:prefix2"],
+    )
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    lastnames = [
+        "".join(rng.choice(letters) for _ in range(rng.randint(5, 12)))
+        for _ in range(400)
+    ]
+    x_records = make_records(args.x_rows, lastnames, rng)
+    y_records = make_records(args.y_rows, lastnames, rng)
+
+    columns = ["lastname", "firstname"]
+    plain = lambda x, y: fuzz.WRatio(str(x).lower(), str(y).lower())
+
+    print(
+        f"{'pass':>28} {'pairs':>10} {'blocks':>7} {'scored':>7}"
+        f" {'lookup s':>9} {'plain s':>9}"
+    )
+
+    for blocking_pass in parse_blocking(args.blocking):
+        x_keys = block_keys(x_records, blocking_pass)
+
+        # Handed over a block after another, as match_blocked does
+        positions = sorted(range(len(x_records)), key=x_keys.__getitem__)
+        x_pass = RecordBatch(x_records.take(positions).table, positions).with_column(
+            BLOCK, [x_keys[j] for j in positions]
+        )
+        y_pass = y_records.with_column(BLOCK, block_keys(y_records, blocking_pass))
+        x_dicts, y_dicts = x_pass.to_records(), y_pass.to_records()
+
+        start = time.perf_counter()
+        block_scores = BlockScores.from_records(
+            x_pass, y_pass, column_pairs(x_pass, y_pass, dict(zip(columns, columns)))
+        )
+        pairs = compare(x_dicts, y_dicts, columns, block_scores)
+        lookup_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        compare(x_dicts, y_dicts, columns, plain)
+        plain_seconds = time.perf_counter() - start
+
+        assert block_scores.blocks_scored <= block_scores.n_blocks, (
+            f"{block_scores.blocks_scored} blocks scored for"
+            f" {block_scores.n_blocks} blocks"
+        )
+
+        print(
+            f"{'+'.join(blocking_pass):>28} {pairs:>10} {block_scores.n_blocks:>7}"
+            f" {block_scores.blocks_scored:>7} {lookup_seconds:>9.2f}"
+            f" {plain_seconds:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
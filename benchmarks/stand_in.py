@@ -0,0 +1,259 @@
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cf_etl.nimsp.store import PageStore
+
+
+OFFICES = (
+    "HOUSE DISTRICT 001",
+    "HOUSE DISTRICT 012",
+    "SENATE DISTRICT 004",
+    "GOVERNOR",
+    "ATTORNEY GENERAL",
+)
+PARTIES = ("DEMOCRATIC", "REPUBLICAN", "LIBERTARIAN", "GREEN", "NONPARTISAN")
+FIRSTNAMES = ("JOHN", "MARY", "JOSE", "ANNE", "ROBERT", "LI", "AISHA", "DAVID")
+LASTNAMES = ("SMITH", "GARCIA", "O'NEIL", "NGUYEN", "JOHNSON", "MULLER", "BROWN")
+
+
+def synthetic_record(rng: random.Random, record_id: int, year: str, state: str):
+    """A record in the same shape as the ones grouped by candidate"""
+    name = (
+        f"{rng.choice(LASTNAMES)}, {rng.choice(FIRSTNAMES)} "
+        f"{rng.choice('ABCDEFGH')}{rng.choice(['', ' JR', ' III'])}"
+    )
+
+    def tag(tag_name, value, token, tag_id=None):
+        return {tag_name: value, "token": token, "id": tag_id or value}
+
+    return {
+        "record_id": str(record_id),
+        "request": f"c-t-id={record_id}",
+        "Candidate": tag("Candidate", name, "c-t-id", str(record_id)),
+        "Candidate_Entity": tag(
+            "Candidate_Entity", name, "c-t-eid", str(rng.randint(1, 10**7))
+        ),
+        "Office_Sought": tag("Office_Sought", rng.choice(OFFICES), "c-r-osid"),
+        "Specific_Party": tag("Specific_Party", rng.choice(PARTIES), "c-t-p"),
+        "Election_Jurisdiction": tag("Election_Jurisdiction", state, "s"),
+        "Election_Year": tag("Election_Year", year, "y"),
+        "Election_Type": tag("Election_Type", "STANDARD", "c-r-t"),
+        "Election_Status": tag("Election_Status", "LOST-GENERAL", "c-t-sts"),
+        "Status_of_Candidate": tag("Status_of_Candidate", "CHALLENGER", "c-t-ico"),
+        "Total_$": tag("Total_$", f"{rng.uniform(0, 10**6):.2f}", "c-t-amt"),
+    }
+
+
+def synthetic_page(
+    page: int,
+    pages: int,
+    per_page: int,
+    year: str = "2024",
+    state: str = "CA",
+    last_updated: str = "2024-05-01 10:00:00",
+) -> dict:
+    """A page of the API, the same page is generated every time"""
+    rng = random.Random(f"{year}-{state}-{page}")
+    first = page * per_page
+
+    return {
+        "metaInfo": {
+            "format": "json",
+            "completeness": {
+                "allReports": "100",
+                "availableReports": "100",
+                "completeReports": "100",
+                "incompleteAvailable": "0",
+                "lastUpdated": last_updated,
+                "mostRecentReportDate": last_updated.split()[0],
+            },
+            "paging": {
+                "pageLink": f"y={year}&p={page}",
+                "minPage": 0,
+                "maxPage": pages - 1,
+                "currentPage": page,
+                "totalPages": pages,
+                "totalRecords": str(pages * per_page),
+                "recordsPerPage": per_page,
+                "recordsThisPage": per_page,
+            },
+            "grouping": {"groupLink": "gro=c-t-id", "currentGrouping": {}},
+            "sorting": {
+                "sortLink": "so=s",
+                "currentSorting": [],
+                "sortingDirection": "1",
+            },
+            "recordFormat": {"request": "c-t-id=", "Candidate": "c-t-id"},
+        },
+        "records": [
+            synthetic_record(rng, first + i, year, state) for i in range(per_page)
+        ],
+    }
+
+
+class StandIn:
+    """Serves pages the way the NIMSP API does, either recorded pages from a
+    directory extracted before or pages that are made up. Latency, blank pages
+    and throttling can be added to make it behave like the real thing."""
+
+    def __init__(
+        self,
+        pages: int = 50,
+        per_page: int = 100,
+        recorded: Path = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        blank_rate: float = 0.0,
+        rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.pages = pages
+        self.per_page = per_page
+        self.latency = latency
+        self.jitter = jitter
+        self.blank_rate = blank_rate
+        self.rate = rate
+        self.requests = 0
+        self.throttled = 0
+        self.blanks = 0
+
+        self.__rng = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__sent = []
+        self.__recorded = {}
+
+        if recorded:
+            store = PageStore(recorded)
+            for page, raw in store.iter_pages():
+                self.__recorded[page] = raw
+            self.pages = len(self.__recorded)
+
+    def is_throttled(self) -> bool:
+        """Anything above the rate within the last second is turned away"""
+        if not self.rate:
+            return False
+        now = time.monotonic()
+        self.__sent = [t for t in self.__sent if now - t < 1]
+        if len(self.__sent) >= self.rate:
+            return True
+        self.__sent.append(now)
+        return False
+
+    def respond(self, params: dict) -> tuple[int, bytes]:
+        """Status and body of the response to the parameters of a call"""
+        with self.__lock:
+            self.requests += 1
+            throttled = self.is_throttled()
+            blank = self.__rng.random() < self.blank_rate
+            delay = self.latency + self.__rng.uniform(0, self.jitter)
+            self.throttled += throttled
+            self.blanks += blank and not throttled
+
+        time.sleep(delay)
+
+        if throttled:
+            return 429, b""
+        if blank:
+            return 200, b""
+
+        page = int(params.get("p", 0))
+
+        if self.__recorded:
+            return 200, self.__recorded.get(page, b"")
+
+        return (
+            200,
+            json.dumps(
+                synthetic_page(
+                    page,
+                    self.pages,
+                    self.per_page,
+                    year=params.get("y", "2024"),
+                    state=params.get("s", "CA"),
+                )
+            ).encode(),
+        )
+
+    def handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                status, body = stand_in.respond({k: v[-1] for k, v in query.items()})
+
+                if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body, compresslevel=1)
+                    encoding = "gzip"
+                else:
+                    encoding = None
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(prog="nimsp_stand_in")
+
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=50, help="pages per query")
+    parser.add_argument("--per_page", type=int, default=100, help="records per page")
+    parser.add_argument(
+        "--recorded",
+        type=Path,
+        help="directory of a page store to serve instead of made up pages",
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="added latency")
+    parser.add_argument(
+        "--blank_rate", type=float, default=0.0, help="share of blank pages"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="requests per second before 429s"
+    )
+
+    args = parser.parse_args()
+
+    stand_in = StandIn(
+        pages=args.pages,
+        per_page=args.per_page,
+        recorded=args.recorded,
+        latency=args.latency,
+        jitter=args.jitter,
+        blank_rate=args.blank_rate,
+        rate=args.rate,
+    )
+    print(f"Serving on http://127.0.0.1:{args.port}")
+    stand_in.serve(port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Throughput of the CRP and NIMSP transforms on made up records.
+
+Builds records in the shape each extractor returns them and reports the
+rows/sec of the transform at every size given.
+
+    python benchmarks/transform.py --rows 10000 100000 1000000
+"""
+
+import time
+import random
+import argparse
+
+from cf_etl.records import RecordBatch
+from cf_etl.parsing import NameMemo
+from cf_etl.crp import transform as crp_transform
+from cf_etl.nimsp import transform as nimsp_transform
+
+
+LASTNAMES = ("SMITH", "GARCÍA", "O'NEIL", "NGUYEN", "MÜLLER", "VAN DYKE", "BROWN")
+FIRSTNAMES = ("JOHN", "MARY", "JOSÉ", "ANNE", "ROBERT", "LI", "AISHA", "DAVID")
+SUFFIXES = ("", "", "", " JR", " III", " SR.")
+NICKNAMES = ("", "", "", ' "BOB"', " (ANNIE)", " 'BILL'")
+OFFICES = (
+    "HOUSE DISTRICT 001",
+    "HOUSE DISTRICT 012-A",
+    "SENATE DISTRICT 004",
+    "GOVERNOR",
+    "ATTORNEY GENERAL",
+)
+PARTIES = ("DEMOCRATIC", "REPUBLICAN", "LIBERTARIAN", "GREEN", "NONPARTISAN")
+DISTRICTS = ("CA12", "TX01", "NYS1", "NYS2", "FLS0", "AK00", "PRES", "WYS2")
+
+
+def nimsp_records(rows: int, rng: random.Random) -> dict:
+    """Records as they are returned by the NIMSP extractor"""
+    return {
+        i: {
+            "NIMSP_ID": str(i),
+            "Candidate_Entity": (
+                f"{rng.choice(LASTNAMES)}{rng.choice(SUFFIXES)}, "
+                f"{rng.choice(FIRSTNAMES)}{rng.choice(NICKNAMES)} "
+                f"{rng.choice('ABCDEFGH')}"
+            ),
+            "Office_Sought": rng.choice(OFFICES),
+            "Specific_Party": rng.choice(PARTIES),
+            "Election_Jurisdiction": "CA",
+            "Election_Year": "2024",
+            "Election_Type": "STANDARD",
+            "Election_Status": "LOST-GENERAL",
+            "Status_of_Candidate": "CHALLENGER",
+        }
+        for i in range(rows)
+    }
+
+
+def crp_records(rows: int, rng: random.Random) -> dict:
+    """Records as they are returned by the CRP extractor"""
+    return {
+        i: {
+            "CID": f"N{i:08}",
+            "CRPName": (
+                f"{rng.choice(LASTNAMES).title()}, "
+                f"{rng.choice(FIRSTNAMES).title()}{rng.choice(NICKNAMES).title()} "
+                f"{rng.choice('ABCDEFGH')}.{rng.choice(SUFFIXES).title()} "
+                f"({rng.choice('DRIL3')})"
+            ),
+            "Party": rng.choice("DRIL3"),
+            "DistIDRunFor": rng.choice(DISTRICTS),
+            "FECCandID": f"H{i:08}",
+        }
+        for i in range(rows)
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(prog="transform_benchmark")
+
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    sources = {
+        "nimsp": (nimsp_records, nimsp_transform),
+        "crp": (crp_records, crp_transform),
+    }
+
+    print(f"{'source':>8} {'rows':>10} {'seconds':>9} {'rows/s':>12}")
+
+    for source, (make_records, module) in sources.items():
+        for rows in args.rows:
+            records = RecordBatch.from_records(
+                make_records(rows, random.Random(args.seed))
+            )
+
+            seconds = float("inf")
+            for _ in range(args.repeat):
+                # Every run parses the names from scratch, rather than finding
+                # them in the names parsed by the run before
+                module.parse_names = NameMemo(module.transform_name)
+
+                start = time.perf_counter()
+                module.main(records)
+                seconds = min(seconds, time.perf_counter() - start)
+
+            print(f"{source:>8} {rows:>10} {seconds:>9.2f} {rows / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import re
+from functools import lru_cache
+from collections import defaultdict
+
+from cf_etl.records import RecordBatch
+
+
+# Column added to the records to group them by the block they fall in
+BLOCK = "block"
+
+# Every candidate is compared against the candidates of the same state
+STATE_BLOCKING = (("state_id",),)
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+# A column, optionally followed by how its values are coded
+KEY_PATTERN = re.compile(
+    r"^(?P<column>[^:]+)(?::(?P<code>soundex|prefix(?P<n>\d+)))?$"
+)
+
+
+@lru_cache(maxsize=100_000)
+def soundex(value: str) -> str:
+    """American soundex of the letters of the value, a letter followed by
+    three digits"""
+    letters = [c for c in value.lower() if c.isalpha()]
+    if not letters:
+        return ""
+
+    code = [letters[0].upper()]
+    previous = SOUNDEX_CODES.get(letters[0], "")
+
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, "")
+        if digit and digit != previous:
+            code.append(digit)
+        # Letters coded the same are only coded once, unless they are split
+        # by a vowel, h and w do not split them
+        if letter not in "hw":
+            previous = digit
+
+    return "".join(code)[:4].ljust(4, "0")
+
+
+def parse_blocking(passes: list[str]) -> tuple[tuple[str, ...], ...]:
+    """Passes given as keys joined by '+', each key being a column along
+    with how its values are coded, such as 'state_id+lastname:soundex' or
+    'state_id+lastname:prefix3'"""
+    blocking = tuple(tuple(blocking_pass.split("+")) for blocking_pass in passes)
+
+    for key in (key for blocking_pass in blocking for key in blocking_pass):
+        if not KEY_PATTERN.match(key):
+            raise ValueError(
+                f"'{key}' is not a blocking key, a key is a column name, "
+                "optionally followed by ':soundex' or ':prefix<n>'."
+            )
+
+    return blocking
+
+
+def blocking_columns(blocking: tuple[tuple[str, ...], ...]) -> list[str]:
+    """Every column the keys of the passes are made from"""
+    return list(
+        dict.fromkeys(
+            KEY_PATTERN.match(key)["column"]
+            for blocking_pass in blocking
+            for key in blocking_pass
+        )
+    )
+
+
+def check_blocking(
+    x_records: RecordBatch, y_records: RecordBatch, blocking=STATE_BLOCKING
+):
+    """Every column the passes are blocked by must be in both records"""
+    for name, records in (
+        ("candidates", x_records),
+        ("VoteSmart's candidates", y_records),
+    ):
+        missing = [
+            column
+            for column in blocking_columns(blocking)
+            if column not in records.columns
+        ]
+        if missing:
+            raise ValueError(
+                f"The {name} have no column {', '.join(missing)} to block by, "
+                f"they only have {', '.join(records.columns)}."
+            )
+
+
+def key_values(records: RecordBatch, key: str) -> list[str]:
+    """Values of the records for a single key, compared without case"""
+    match = KEY_PATTERN.match(key)
+    values = [value.strip().lower() for value in records.column(match["column"])]
+
+    if match["code"] == "soundex":
+        return [soundex(value) for value in values]
+    if match["n"]:
+        return [value[: int(match["n"])] for value in values]
+    return values
+
+
+def block_keys(records: RecordBatch, blocking_pass: tuple[str, ...]) -> list[str]:
+    """The block every record falls in for a single pass"""
+    return [
+        "|".join(values)
+        for values in zip(*(key_values(records, key) for key in blocking_pass))
+    ]
+
+
+def count_pairs(x_keys: list[str], y_keys: list[str]) -> int:
+    """Pairs compared when only records in the same block are compared"""
+    y_sizes = defaultdict(int)
+    for key in y_keys:
+        y_sizes[key] += 1
+    return sum(y_sizes[key] for key in x_keys)
+
+
+class BlockingIndex:
+    """The blocks every record falls in for every pass. Passes are run as a
+    cascade, a record is only compared with the records sharing its block in
+    the first pass it is matched in, or in every pass if it is never
+    matched.
+    """
+
+    def __init__(
+        self, x_records: RecordBatch, y_records: RecordBatch, blocking=STATE_BLOCKING
+    ) -> None:
+        check_blocking(x_records, y_records, blocking)
+
+        self.blocking = blocking
+        self.n_x = len(x_records)
+        self.n_y = len(y_records)
+
+        self.x_keys = [block_keys(x_records, p) for p in blocking]
+        self.y_keys = [block_keys(y_records, p) for p in blocking]
+
+        # Pairs compared if records were only blocked by state, as before
+        self.state_pairs = count_pairs(
+            block_keys(x_records, STATE_BLOCKING[0]),
+            block_keys(y_records, STATE_BLOCKING[0]),
+        )
+
+    def pass_name(self, i: int) -> str:
+        return "+".join(self.blocking[i])
+
+    def pass_pairs(self, i: int, positions: list[int] = None) -> int:
+        """Pairs compared by a pass for the records at the given positions,
+        every record if none are given"""
+        x_keys = self.x_keys[i]
+        if positions is not None:
+            x_keys = [x_keys[j] for j in positions]
+        return count_pairs(x_keys, self.y_keys[i])
+
+    def ratio(self, pairs: int) -> str:
+        all_pairs = self.n_x * self.n_y
+        if not self.state_pairs or not all_pairs:
+            return str(pairs)
+        return (
+            f"{pairs} ({pairs / self.state_pairs:.1%} of state pairs, "
+            f"{pairs / all_pairs:.1%} of all pairs)"
+        )
+
+    def report(self) -> dict:
+        """Pairs each pass would compare if every record went through it,
+        the cascade compares the records matched by a pass in no pass after
+        it"""
+        return {
+            "All Pairs": [self.n_x * self.n_y],
+            "State Pairs": [self.state_pairs],
+            **{
+                f"Pass {self.pass_name(i)} (at most)": [self.ratio(self.pass_pairs(i))]
+                for i in range(len(self.blocking))
+            },
+        }
+
+
+def match_blocked(
+    x_records: RecordBatch,
+    y_records: RecordBatch,
+    match_pass,
+    blocking=STATE_BLOCKING,
+) -> RecordBatch:
+    """Matches the records a pass at a time, grouped by the block they fall
+    in. A record matched in a pass is not matched again in the passes after
+    it, those are only for the records left without a match.
+
+    match_pass takes both records, where the BLOCK column is the column to
+    group by, and returns the records matched by their index.
+    """
+    index = BlockingIndex(x_records, y_records, blocking)
+
+    for name, l in index.report().items():
+        print(f"\033[1m{name}:\033[0m {l[0]}")
+
+    records_matched = {}
+    remaining = list(range(len(x_records)))
+    pairs_compared = 0
+
+    for i in range(len(blocking)):
+        if not remaining:
+            break
+
+        print(f"\033[1m\nPass {index.pass_name(i)}:\033[0m")
+
+        pairs = index.pass_pairs(i, remaining)
+        pairs_compared += pairs
+        print(f"\033[1mPairs Compared:\033[0m {index.ratio(pairs)}")
+
+        # Records are indexed by their position while they are matched, and
+        # handed over a block after another
+        positions = sorted(remaining, key=index.x_keys[i].__getitem__)
+        x_pass = RecordBatch(x_records.take(positions).table, positions).with_column(
+            BLOCK, [index.x_keys[i][j] for j in positions]
+        )
+        y_pass = y_records.with_column(BLOCK, index.y_keys[i])
+
+        matched = match_pass(x_pass, y_pass)
+
+        for j in remaining:
+            matched[j].pop(BLOCK, None)
+            records_matched[j] = matched[j]
+
+        # Only the records left without a match go on to the next pass
+        remaining = [
+            j
+            for j in remaining
+            if not str(matched[j].get("candidate_id") or "").strip()
+        ]
+
+    print(f"\033[1m\nPairs Compared:\033[0m {index.ratio(pairs_compared)}")
+
+    records_matched = RecordBatch.from_records(
+        {j: records_matched[j] for j in range(len(x_records))}
+    )
+
+    return RecordBatch(records_matched.table, x_records.index)
@@ -1,23 +1,168 @@
+import hashlib
 from pathlib import Path
+from typing import Iterator
 
 # External Libraries and Packages
-import pandas
-import numpy
+import xlrd
+import pyarrow
+import openpyxl
 
+from cf_etl.records import RecordBatch
+from cf_etl.crp.transform import (
+    CRP_ID,
+    NAME,
+    PARTY,
+    DISTRICT,
+    FEC_ID,
+    SOURCE_FILE,
+)
 
-STARTING_ROW = 14
-STARTING_COLUMN = 1
 
+# Only the columns used by the transform are read
+COLUMNS = (CRP_ID, NAME, PARTY, DISTRICT, FEC_ID)
 
-def main(crp_file: Path) -> dict[int, dict[str, str]]:
-    """Cleans the file: remove blank rows and columns"""
-    df_crp = pandas.read_excel(crp_file, header=None)
+# The header is looked for within the banner rows on top of the sheet
+HEADER_SEARCH_ROWS = 100
 
-    df_extracted = df_crp.iloc[STARTING_ROW:, STARTING_COLUMN:].reset_index(drop=True)
-    df_extracted.rename(df_crp.iloc[STARTING_ROW - 1], axis="columns", inplace=True)
+# Parsed sheets cached by an older version of the parser are not reused,
+# raise whenever the records read from the same workbook would change
+PARSER_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
 
-    df_extracted.replace(numpy.nan, "", inplace=True)
 
-    records_extracted = df_extracted.to_dict(orient="index")
+def iter_rows(crp_file: Path) -> Iterator[tuple]:
+    """Yields the values of every row of the first sheet as it is read,
+    without loading the whole workbook"""
+    if crp_file.suffix.lower() == ".xls":
+        book = xlrd.open_workbook(crp_file, on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            for i in range(sheet.nrows):
+                yield sheet.row_values(i)
+        finally:
+            book.release_resources()
+        return
+
+    book = openpyxl.load_workbook(crp_file, read_only=True, data_only=True)
+    try:
+        yield from book.worksheets[0].iter_rows(values_only=True)
+    finally:
+        book.close()
+
+
+def find_header(rows: Iterator[tuple], columns=COLUMNS) -> dict[str, int]:
+    """Reads up to the header row, the row that holds every column name, and
+    returns where each column is"""
+    for _, row in zip(range(HEADER_SEARCH_ROWS), rows):
+        names = [str(value).strip() if value is not None else "" for value in row]
+        if all(column in names for column in columns):
+            return {column: names.index(column) for column in columns}
+
+    raise ValueError(
+        f"No row within the first {HEADER_SEARCH_ROWS} rows holds every one of"
+        f" the columns {', '.join(columns)}."
+    )
+
+
+def cell_value(value) -> str | None:
+    """Whole numbers are read as floats from .xls files, they are kept as
+    they appear in the sheet and blank cells are missing"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip() if value is not None else ""
+    return value if value else None
+
+
+def read_workbook(crp_file: Path) -> RecordBatch:
+    """Reads the records below the header row, blank rows are skipped"""
+    rows = iter_rows(crp_file)
+    positions = find_header(rows)
+
+    columns = {column: [] for column in positions}
+
+    for row in rows:
+        values = [
+            cell_value(row[i]) if i < len(row) else None for i in positions.values()
+        ]
+        if not any(values):
+            continue
+
+        for column, value in zip(columns.values(), values):
+            column.append(value)
+
+    records_extracted = RecordBatch.from_columns(columns)
 
     return records_extracted
+
+
+def content_hash(file: Path) -> str:
+    """Hash of the contents of the file, read a chunk at a time"""
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def path_hash(file: Path) -> str:
+    """Tells apart workbooks of the same name kept in different places"""
+    return hashlib.sha256(str(file.resolve()).encode()).hexdigest()[:8]
+
+
+def cached_file(crp_file: Path, cache_dir: Path) -> Path:
+    """Where the sheet parsed from the workbook as it is now is cached"""
+    return cache_dir / (
+        f"{crp_file.stem}_{path_hash(crp_file)}_{content_hash(crp_file)[:16]}"
+        f"_v{PARSER_VERSION}.arrow"
+    )
+
+
+def read_cache(file: Path) -> RecordBatch:
+    """The cached records are memory-mapped rather than read into memory"""
+    source = pyarrow.memory_map(str(file))
+    return RecordBatch(pyarrow.ipc.open_file(source).read_all())
+
+
+def write_cache(records: RecordBatch, file: Path):
+    """The cached copy is written in one step so it is never left half
+    written"""
+    file.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_file = file.with_suffix(".tmp")
+    with pyarrow.ipc.new_file(str(tmp_file), records.table.schema) as writer:
+        writer.write_table(records.table)
+    tmp_file.replace(file)
+
+
+def read_cached_workbook(crp_file: Path, cache_dir: Path) -> RecordBatch:
+    """Reads the cached copy of the workbook if it was parsed before with
+    the same contents"""
+    file = cached_file(crp_file, cache_dir)
+
+    if file.exists():
+        print(f"Reading {crp_file.name} from the cache...")
+        return read_cache(file)
+
+    records_extracted = read_workbook(crp_file)
+    write_cache(records_extracted, file)
+
+    # Copies cached from earlier contents of the same workbook are dropped
+    stale_copies = f"{crp_file.stem}_{path_hash(crp_file)}_{'?' * 16}_v*.arrow"
+    for stale in cache_dir.glob(stale_copies):
+        if stale != file:
+            stale.unlink(missing_ok=True)
+
+    return records_extracted
+
+
+def main(crp_file: Path, cache_dir: Path = None) -> RecordBatch:
+    """Reads the workbook, from the cache if one is given, and notes the
+    path of the workbook, as it was given, on every record"""
+    if cache_dir is None:
+        records_extracted = read_workbook(crp_file)
+    else:
+        records_extracted = read_cached_workbook(crp_file, cache_dir)
+
+    return records_extracted.with_column(
+        SOURCE_FILE, [crp_file.as_posix()] * len(records_extracted)
+    )
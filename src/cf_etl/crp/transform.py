@@ -1,8 +1,12 @@
 import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 # External Libraries and Packages
 import pandas
-from unidecode import unidecode
+
+from cf_etl.records import STRING, RecordBatch, iter_batches
+from cf_etl.parsing import NameMemo, parse_unique, to_ascii
 
 
 CRP_ID = "CID"
@@ -11,6 +15,9 @@ PARTY = "Party"
 DISTRICT = "DistIDRunFor"
 FEC_ID = "FECCandID"
 
+# Which file a record was read from, kept as it is through every stage
+SOURCE_FILE = "source_file"
+
 COLUMNS_TO_RENAME = {PARTY: "party", DISTRICT: "district"}
 
 
@@ -32,37 +39,58 @@ VALUES_TO_REPLACE = {
 }
 
 
+MIDDLENAME_PATTERN = re.compile(r"(\w+\s+\b)(?P<middlename>[A-Z]{1}\.?)\b")
+NICKNAME_PATTERN = re.compile(r"[\"\'\(](?P<nickname>.*?)[\"\'\)]")
+SUFFIX_PATTERN = re.compile(
+    r"\s+(?P<suffix>[IVX][IVX]+$|[DJMS][rs][s]?[\.]?)|[M][\.][D][\.]?"
+)
+
+# The first name is what is left once the middle name, nickname and suffix
+# are taken out, the word before the middle name is kept
+FIRSTNAME_REMOVE = re.compile(
+    f"{MIDDLENAME_PATTERN.pattern}|{NICKNAME_PATTERN.pattern}|{SUFFIX_PATTERN.pattern}"
+)
+
+STATE_PATTERN = re.compile(r"(?P<state_id>^..)")
+DISTRICT_PATTERN = re.compile(rf"(?P<{DISTRICT}>..$)")
+HOUSE_PATTERN = re.compile(r"^\d+$")
+DISTRICT_REMOVE = re.compile(r"^0+|(ES)|[S]\d?")
+
+# Records transformed at a time in batch mode
+BATCH_SIZE = 50_000
+
+strip_nonwords = lambda x: x.str.strip(" .")
+
+
 def transform_name(series: pandas.Series) -> pandas.DataFrame:
     """Splits the name into first, middle, nick and last names"""
 
-    strip_nonwords = lambda x: x.strip(" .") if isinstance(x, str) else x
-    middlename = r"(\w+\s+\b)(?P<middlename>[A-Z]{1}\.?)\b"
-    nickname = r"[\"\'\(](?P<nickname>.*?)[\"\'\)]"
-    suffix = r"\s+(?P<suffix>[IVX][IVX]+$|[DJMS][rs][s]?[\.]?)|[M][\.][D][\.]?"
-    firstname = lambda x: (
-        re.sub(f"{middlename}|{nickname}|{suffix}", r"\1", x)
-        if isinstance(x, str)
-        else x
-    )
-
-    series = series.apply(lambda x: unidecode(x))
+    series = to_ascii(series)
 
-    df_name_split = series.str.split(pat=",", expand=True).apply(
-        lambda x: x.apply(strip_nonwords)
+    # A column for the first names even if none of the names has one
+    df_name_split = (
+        series.str.split(pat=",", expand=True)
+        .reindex(columns=[0, 1])
+        .astype(STRING)
+        .apply(strip_nonwords)
+    )
+    series_firstname = (
+        df_name_split[1]
+        .str.replace(FIRSTNAME_REMOVE, r"\1", regex=True)
+        .rename("firstname")
     )
-    series_firstname = df_name_split[1].apply(firstname).rename("firstname")
-    series_middlename = df_name_split[1].str.extract(middlename)["middlename"]
-    series_nickname = df_name_split[1].str.extract(nickname)["nickname"]
-    series_suffix = df_name_split[1].str.extract(suffix)["suffix"]
+    series_middlename = df_name_split[1].str.extract(MIDDLENAME_PATTERN)["middlename"]
+    series_nickname = df_name_split[1].str.extract(NICKNAME_PATTERN)["nickname"]
+    series_suffix = df_name_split[1].str.extract(SUFFIX_PATTERN)["suffix"]
     series_lastname = df_name_split[0].rename("lastname")
 
     return pandas.concat(
         [
-            series_firstname.apply(strip_nonwords),
-            series_middlename.apply(strip_nonwords),
-            series_lastname.apply(strip_nonwords),
-            series_suffix.apply(strip_nonwords),
-            series_nickname.apply(strip_nonwords),
+            strip_nonwords(series_firstname),
+            strip_nonwords(series_middlename),
+            strip_nonwords(series_lastname),
+            strip_nonwords(series_suffix),
+            strip_nonwords(series_nickname),
         ],
         axis=1,
     )
@@ -71,13 +99,13 @@ def transform_name(series: pandas.Series) -> pandas.DataFrame:
 def get_election_info(series: pandas.Series) -> pandas.DataFrame:
     """Use regex to split apart series to state, district and office"""
 
-    state_id = r"(?P<state_id>^..)"
-    district = rf"(?P<{DISTRICT}>..$)"
-    office = lambda x: re.sub("^\d+$", "U.S. House", x)
-
-    series_state = series.str.extract(state_id)["state_id"]
-    series_district = series.str.extract(district)[DISTRICT]
-    series_office = series_district.replace(VALUES_TO_REPLACE[DISTRICT]).apply(office)
+    series_state = series.str.extract(STATE_PATTERN)["state_id"]
+    series_district = series.str.extract(DISTRICT_PATTERN)[DISTRICT]
+    series_office = (
+        series_district.replace(VALUES_TO_REPLACE[DISTRICT])
+        .str.replace(HOUSE_PATTERN, "U.S. House", regex=True)
+        .rename("office")
+    )
 
     presidential_index = series_office.loc[series_office == "President"].index
     series_state[presidential_index] = "NA"
@@ -85,19 +113,25 @@ def get_election_info(series: pandas.Series) -> pandas.DataFrame:
     return pandas.concat(
         [
             series_state,
-            series_office.rename("office"),
-            series_district.apply(lambda x: re.sub("^0+|(ES)|[S]\d?", "", x)),
+            series_office,
+            series_district.str.replace(DISTRICT_REMOVE, "", regex=True),
         ],
         axis=1,
     )
 
 
-def main(records_extracted: dict[int, dict[str, str]]) -> dict[int, dict[str, str]]:
+parse_names = NameMemo(transform_name)
+
 
-    df = pandas.DataFrame.from_dict(records_extracted, orient="index")
+def main(records_extracted: RecordBatch, workers: int = 1) -> RecordBatch:
 
-    df_name = transform_name(df[NAME])
-    df_info = get_election_info(df[DISTRICT])
+    if workers > 1:
+        return transform_partitions(records_extracted, workers)
+
+    df = records_extracted.to_frame()
+
+    df_name = parse_names(df[NAME])
+    df_info = parse_unique(df[DISTRICT], get_election_info)
 
     df_transformed = pandas.concat(
         [
@@ -106,6 +140,7 @@ def main(records_extracted: dict[int, dict[str, str]]) -> dict[int, dict[str, st
             df[PARTY],
             df[CRP_ID],
             df[FEC_ID],
+            *([df[SOURCE_FILE]] if SOURCE_FILE in df else []),
         ],
         axis=1,
     )
@@ -113,8 +148,41 @@ def main(records_extracted: dict[int, dict[str, str]]) -> dict[int, dict[str, st
     df_transformed.replace(VALUES_TO_REPLACE, inplace=True)
     df_transformed.rename(columns=COLUMNS_TO_RENAME, inplace=True)
 
-    records_transformed = (
-        df_transformed.astype(str).replace("nan", "").to_dict(orient="index")
-    )
+    records_transformed = RecordBatch.from_frame(df_transformed)
 
     return records_transformed
+
+
+def partition(records: RecordBatch) -> list[list[int]]:
+    """Positions of the records split by the state of the district they ran
+    for"""
+    partitions = defaultdict(list)
+    for i, district in enumerate(records.column(DISTRICT)):
+        partitions[district[:2]].append(i)
+
+    return list(partitions.values())
+
+
+def transform_partitions(records_extracted: RecordBatch, workers: int) -> RecordBatch:
+    """Transforms every partition of the records in a separate process, the
+    records transformed are put back in the order they were extracted"""
+    partitions = partition(records_extracted)
+
+    with ProcessPoolExecutor(workers) as executor:
+        records_transformed = RecordBatch.concat(
+            list(executor.map(main, map(records_extracted.take, partitions)))
+        )
+
+    positions = [i for positions in partitions for i in positions]
+    return records_transformed.take(
+        sorted(range(len(positions)), key=positions.__getitem__)
+    )
+
+
+def iter_main(batches, batch_size: int = BATCH_SIZE, workers: int = 1):
+    """Transforms batches of records of any size as they come in and yields
+    them transformed in batches of batch_size records, so that only a single
+    batch is held in memory at a time"""
+
+    for records_batch in iter_batches(batches, batch_size):
+        yield main(records_batch, workers)
@@ -2,37 +2,131 @@ import os
 import argparse
 from pathlib import Path
 from datetime import datetime
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
 
 # External packages and libraries
-import pandas
 from dotenv import load_dotenv
 
 # Internal packages and libraries
 if __name__ == "__main__":
+    from records import RecordBatch
+    from blocking import parse_blocking
     from crp.extract import main as extract
+    from crp.transform import SOURCE_FILE
     from crp.match import main as match
     from crp.transform import main as transform
+    from crp.transform import iter_main as iter_transform
 else:
+    from cf_etl.records import RecordBatch
+    from cf_etl.blocking import parse_blocking
     from cf_etl.crp.extract import main as extract
+    from cf_etl.crp.transform import SOURCE_FILE
     from cf_etl.crp.match import main as match
     from cf_etl.crp.transform import main as transform
+    from cf_etl.crp.transform import iter_main as iter_transform
+
+# Files read as the OpenSecrets workbook rather than as a saved CSV
+WORKBOOKS = (".xls", ".xlsx")
+
+
+def is_workbook(file: Path) -> bool:
+    return file.suffix.lower() in WORKBOOKS
+
+
+def list_files(paths: list[Path]) -> list[Path]:
+    """Every file given, along with the workbooks and CSV files within every
+    directory given. Files within a directory keep the directory as it was
+    given in front of their name, so files of the same name in different
+    directories are told apart."""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(
+                sorted(
+                    file
+                    for file in path.iterdir()
+                    if is_workbook(file) or file.suffix.lower() == ".csv"
+                )
+            )
+        else:
+            files.append(path)
+
+    return files
+
+
+def note_source(records: RecordBatch, file: Path) -> RecordBatch:
+    """Records of a file saved before the source file was noted are noted
+    with the path of the file, as it was given"""
+    if SOURCE_FILE in records.columns:
+        return records
+    return records.with_column(SOURCE_FILE, [file.as_posix()] * len(records))
+
+
+def read_file(file: Path, cache_dir: Path = None) -> RecordBatch:
+    """Reads a workbook, or a CSV file saved by a previous step"""
+    if is_workbook(file):
+        return extract(file, cache_dir)
+    return note_source(RecordBatch.read_csv(file), file)
+
+
+def read_files(files: list[Path], cache_dir: Path = None, workers: int = 1):
+    """Reads every file, across processes if more than one worker is given.
+    The records are numbered again, in the order of the files."""
+    if workers <= 1:
+        return RecordBatch.concat(
+            [read_file(file, cache_dir) for file in files], ignore_index=True
+        )
+
+    with ProcessPoolExecutor(workers) as executor:
+        return RecordBatch.concat(
+            list(executor.map(read_file, files, repeat(cache_dir))),
+            ignore_index=True,
+        )
 
 
-def save_records(
-    records: dict[int, dict[str, str]], filepath: Path, filename: str = None
-):
+def iter_read_files(files: list[Path], cache_dir: Path, batch_size: int):
+    """Reads the files one after another, CSV files a batch at a time. The
+    records are numbered on from one file to the next."""
+    n_records = 0
+
+    for file in files:
+        batches = (
+            [extract(file, cache_dir)]
+            if is_workbook(file)
+            else RecordBatch.read_csv(file, batch_size)
+        )
+        for records in batches:
+            yield RecordBatch(
+                note_source(records, file).table,
+                range(n_records, n_records + len(records)),
+            )
+            n_records += len(records)
+
+
+def save_records(records: RecordBatch, filepath: Path, filename: str = None):
 
     filepath.mkdir(exist_ok=True)
 
     timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d-%H%M%S-%f")
 
-    df = pandas.DataFrame.from_dict(records, orient="index")
-    df.to_csv(
-        filepath / f"{filename if filename else 'records'}_{timestamp}.csv",
-        index=False,
+    records.to_csv(
+        filepath / f"{filename if filename else 'records'}_{timestamp}.csv"
     )
 
 
+def save_batches(batches, filepath: Path, filename: str = None):
+    """Appends every batch of records to the same file as it comes in"""
+
+    filepath.mkdir(exist_ok=True)
+
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d-%H%M%S-%f")
+    file = filepath / f"{filename if filename else 'records'}_{timestamp}.csv"
+
+    for i, records in enumerate(batches):
+        records.to_csv(file, append=bool(i))
+
+
 def main():
 
     parser = argparse.ArgumentParser(prog="campaign_finance_crp")
@@ -41,8 +135,11 @@ def main():
         "-f",
         "--file",
         type=Path,
+        nargs="+",
         required=True,
-        help="filepath of the spreadsheet file to read",
+        help="filepath(s) of the spreadsheet files to read, or directories"
+        " holding them, with -t and -m either OpenSecrets workbooks or CSV files"
+        " saved by the previous step",
     )
 
     parser.add_argument(
@@ -60,6 +157,46 @@ def main():
         help="election year(s) of candidates",
     )
 
+    parser.add_argument(
+        "-b",
+        "--batch_size",
+        type=int,
+        help="number of records transformed at a time, with -t the spreadsheet"
+        " is also read and saved a batch at a time",
+    )
+
+    parser.add_argument(
+        "--transform_workers",
+        type=int,
+        default=1,
+        help="number of processes the records are transformed across, split by"
+        " state",
+    )
+
+    parser.add_argument(
+        "--file_workers",
+        type=int,
+        default=1,
+        help="number of processes the files are read across",
+    )
+
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="parse the workbook again instead of reading it from the cache",
+    )
+
+    parser.add_argument(
+        "--blocking",
+        nargs="+",
+        default=["state_id"],
+        help="blocking passes candidates are matched in, a candidate is only"
+        " compared with candidates that share the values of every key of the"
+        " pass. Keys are joined by '+' and can be coded, as in"
+        " 'state_id+office' 'state_id+lastname:soundex' 'state_id+lastname:prefix3'."
+        " Candidates left without a match go on to the next pass",
+    )
+
     parser.add_argument(
         "-e",
         "--extract",
@@ -83,6 +220,11 @@ def main():
 
     args = parser.parse_args()
 
+    try:
+        blocking = parse_blocking(args.blocking)
+    except ValueError as e:
+        parser.error(str(e))
+
     package_dir = Path(__file__).parent
     load_dotenv(package_dir / "config" / ".env")
 
@@ -94,15 +236,31 @@ def main():
         "password": os.getenv("VSDB_PASSWORD"),
     }
 
+    # The parsed workbook is cached by its contents, later runs on the same
+    # workbook skip the parsing
+    cache_dir = None if args.no_cache else args.export_path / "CRP_CACHE"
+
+    files = list_files(args.file)
+
     if not (any((args.extract, args.transform, args.match))):
-        records_extracted = extract(args.file)
+        records_extracted = read_files(files, cache_dir, args.file_workers)
         save_records(
             records_extracted,
             args.export_path,
             "CRP-Extract",
         )
 
-        records_transformed = transform(records_extracted)
+        if args.batch_size:
+            records_transformed = RecordBatch.concat(
+                list(
+                    iter_transform(
+                        [records_extracted], args.batch_size, args.transform_workers
+                    )
+                )
+            )
+        else:
+            records_transformed = transform(records_extracted, args.transform_workers)
+
         save_records(
             records_transformed,
             args.export_path,
@@ -110,7 +268,7 @@ def main():
         )
 
         records_verified, records_queried = match(
-            records_transformed, db_connection_info, args.years
+            records_transformed, db_connection_info, args.years, blocking
         )
         save_records(
             records_verified,
@@ -125,7 +283,7 @@ def main():
         )
 
     elif args.extract and not (any((args.transform, args.match))):
-        records_extracted = extract(args.file)
+        records_extracted = read_files(files, cache_dir, args.file_workers)
         save_records(
             records_extracted,
             args.export_path,
@@ -133,32 +291,57 @@ def main():
         )
 
     elif args.transform and not (any((args.extract, args.match))):
-        if not args.file:
+        if not files:
             parser.print_help()
             parser.error("Please specify the filepath of the spreadsheet.")
 
-        df_extracted = pandas.read_csv(args.file)
-        records_extracted = df_extracted.to_dict(orient="index")
-
-        records_transformed = transform(records_extracted)
-        save_records(
-            records_transformed,
-            args.export_path,
-            "CRP-Transformed",
-        )
+        if args.batch_size:
+            save_batches(
+                iter_transform(
+                    iter_read_files(files, cache_dir, args.batch_size),
+                    args.batch_size,
+                    args.transform_workers,
+                ),
+                args.export_path,
+                "CRP-Transformed",
+            )
+
+        else:
+            records_extracted = read_files(files, cache_dir, args.file_workers)
+
+            records_transformed = transform(records_extracted, args.transform_workers)
+            save_records(
+                records_transformed,
+                args.export_path,
+                "CRP-Transformed",
+            )
 
     elif args.match and not (any((args.extract, args.transform))):
-        if not args.file:
+        if not files:
             parser.print_help()
             parser.error("Please specify the filepath of the spreadsheet.")
 
-        df_transformed = pandas.read_csv(
-            args.file, na_values="nan", keep_default_na=False
-        )
-        records_transformed = df_transformed.to_dict(orient="index")
+        # Workbooks can be matched along with saved files, they are
+        # transformed first
+        workbooks = [file for file in files if is_workbook(file)]
+        saved_files = [file for file in files if not is_workbook(file)]
+
+        batches_transformed = []
+        if saved_files:
+            batches_transformed.append(
+                read_files(saved_files, cache_dir, args.file_workers)
+            )
+        if workbooks:
+            batches_transformed.append(
+                transform(
+                    read_files(workbooks, cache_dir, args.file_workers),
+                    args.transform_workers,
+                )
+            )
+        records_transformed = RecordBatch.concat(batches_transformed, ignore_index=True)
 
         records_verified, records_queried = match(
-            records_transformed, db_connection_info, args.years
+            records_transformed, db_connection_info, args.years, blocking
         )
         save_records(
             records_verified,
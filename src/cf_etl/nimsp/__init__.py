@@ -1 +1 @@
-__all__ = ['api', 'extract', 'match', 'transform']
\ No newline at end of file
+__all__ = ['api', 'cache', 'extract', 'match', 'store', 'transform']
\ No newline at end of file
@@ -1,17 +1,237 @@
 import json
-import requests
+import time
+import random
+import threading
 from datetime import datetime
 
+import requests
+from requests.adapters import HTTPAdapter
+
 
 split_params = lambda link: {p.split("=")[0]: p.split("=")[1] for p in link.split("&")}
 combine_params = lambda built: "&".join(f"{k}={v}" for k, v in built.items())
 
 
+class JSONStream:
+    """Decodes a JSON document from chunks of text, one value at a time, so
+    that only the value being decoded has to be held in memory"""
+
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self, chunks) -> None:
+        self.__chunks = iter(chunks)
+        self.__decoder = json.JSONDecoder()
+        self.__buffer = ""
+        self.__pos = 0
+        self.__exhausted = False
+
+    def fill(self) -> bool:
+        """Reads the next chunk, drops the text that has been decoded"""
+        chunk = next(self.__chunks, None)
+        if chunk is None:
+            self.__exhausted = True
+            return False
+        self.__buffer = self.__buffer[self.__pos :] + chunk
+        self.__pos = 0
+        return True
+
+    def peek(self) -> str:
+        """The next character that is not whitespace"""
+        while True:
+            while (
+                self.__pos < len(self.__buffer)
+                and self.__buffer[self.__pos] in self.WHITESPACE
+            ):
+                self.__pos += 1
+            if self.__pos < len(self.__buffer):
+                return self.__buffer[self.__pos]
+            if not self.fill():
+                raise json.decoder.JSONDecodeError(
+                    "Unexpected end of data", self.__buffer, self.__pos
+                )
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if char not in chars:
+            raise json.decoder.JSONDecodeError(
+                f"Expecting one of '{chars}'", self.__buffer, self.__pos
+            )
+        self.__pos += 1
+        return char
+
+    def value(self):
+        """Decodes the next complete value, reading more chunks as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.__decoder.raw_decode(self.__buffer, self.__pos)
+            except json.decoder.JSONDecodeError:
+                if self.__exhausted or not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end < len(self.__buffer) or self.__exhausted or not self.fill():
+                break
+        self.__pos = end
+        return value
+
+    def items(self):
+        """Yields the key and the stream positioned at the value of each
+        member of the object, the value must be consumed before the next"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.__pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self
+            if self.expect(",}") == "}":
+                return
+
+    def elements(self):
+        """Yields every element of the array, one at a time"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.__pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_records(chunks):
+    """Yields every record from the chunks of a page, one at a time"""
+    for key, stream in JSONStream(chunks).items():
+        if key == "records" and stream.peek() == "[":
+            yield from stream.elements()
+        else:
+            stream.value()
+
+
+class CallStats:
+    """Counters shared by every call made through a single NIMSPApi"""
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.waiting = 0.0
+
+    def add(self, retries=0, failures=0, size=0, seconds=0.0, waiting=0.0):
+        with self.__lock:
+            self.calls += 1
+            self.retries += retries
+            self.failures += failures
+            self.bytes += size
+            self.seconds += seconds
+            self.waiting += waiting
+
+    @property
+    def seconds_per_call(self) -> float:
+        return self.seconds / self.calls if self.calls else 0.0
+
+    def report(self) -> dict:
+        return {
+            "Calls": [self.calls],
+            "Retries": [self.retries],
+            "Failed Calls": [self.failures],
+            "Bytes Transferred": [self.bytes],
+            "Seconds per Call": [round(self.seconds_per_call, 3)],
+            "Seconds Waiting": [round(self.waiting, 3)],
+            "Seconds Fetching": [round(self.seconds - self.waiting, 3)],
+        }
+
+
+class RateLimiter:
+    """A token bucket shared by every caller using the same API key.
+
+    Requests are let through at a steady rate, and fewer of them are let
+    through at the same time whenever the API starts returning blank or
+    throttled responses. Concurrency is halved on each of those, and given
+    back one at a time after a run of successful requests.
+    """
+
+    def __init__(self, rate: float, concurrency: int, recover_after: int = 20):
+        self.rate = rate
+        self.max_concurrency = max(1, concurrency)
+        self.concurrency = self.max_concurrency
+        self.recover_after = recover_after
+        self.slowdowns = 0
+
+        self.__condition = threading.Condition()
+        self.__tokens = 1.0
+        self.__updated = time.monotonic()
+        self.__in_flight = 0
+        self.__successes = 0
+
+    def acquire(self) -> float:
+        """Waits for a free slot and a token, returns the seconds waited"""
+        start = time.perf_counter()
+
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__in_flight < self.concurrency)
+            self.__in_flight += 1
+
+            # Tokens are reserved ahead, so the wait happens outside the lock
+            delay = 0.0
+            if self.rate > 0:
+                now = time.monotonic()
+                self.__tokens = min(
+                    1.0, self.__tokens + (now - self.__updated) * self.rate
+                )
+                self.__updated = now
+                self.__tokens -= 1
+                delay = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+
+        time.sleep(delay)
+
+        return time.perf_counter() - start
+
+    def release(self, throttled: bool = False):
+        with self.__condition:
+            self.__in_flight -= 1
+
+            if throttled:
+                self.slow_down()
+            else:
+                self.__successes += 1
+                if (
+                    self.__successes >= self.recover_after
+                    and self.concurrency < self.max_concurrency
+                ):
+                    self.concurrency += 1
+                    self.__successes = 0
+
+            self.__condition.notify_all()
+
+    def slow_down(self):
+        """Halves the number of requests let through at the same time"""
+        with self.__condition:
+            self.concurrency = max(1, self.concurrency // 2)
+            self.__successes = 0
+            self.slowdowns += 1
+
+    def report(self) -> dict:
+        return {
+            "Requests per Second": [self.rate or "Unlimited"],
+            "Concurrency": [f"{self.concurrency} of {self.max_concurrency}"],
+            "Slowdowns": [self.slowdowns],
+        }
+
+
 class NIMSPApi:
     """A caller and wrapper to the NIMSP API"""
 
     URL = "https://api.followthemoney.org"
     API_KEY = None
+    TIMEOUT = 60
+    # Responses with these status codes are worth asking again
+    RETRY_STATUS = (429, 500, 502, 503, 504)
     TOKEN_REF = {
         "APIKey": "API Key",
         "mode": "Page Format",
@@ -57,11 +277,36 @@ class NIMSPApi:
 
     TOKEN_VALUE_REF = {"sod": {"0": "Descending", "1": "Ascending"}}
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        retries: int = 3,
+        backoff: float = 0.5,
+        backoff_max: float = 30.0,
+        pool_size: int = 10,
+        cache=None,
+        limiter: RateLimiter = None,
+    ) -> None:
         self.__built = {
             "APIKey": self.API_KEY,
             "mode": "json",
         }
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.stats = CallStats()
+        self.cache = cache
+        self.limiter = limiter
+        # Once known, cached responses must have been updated at the same time
+        self.last_updated = None
+
+        # One session for every call so connections are kept alive and reused
+        self.session = requests.Session()
+        self.session.headers.update(
+            {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def build(self, params: dict):
         """Create the URL parameters appropriate for the API call"""
@@ -72,6 +317,11 @@ class NIMSPApi:
         for p in param_names:
             self.__built.pop(p)
 
+    @property
+    def params(self) -> dict:
+        """The URL parameters built so far"""
+        return dict(self.__built)
+
     @property
     def url(self):
         """Combine the URL parameters to be part of the main URL"""
@@ -94,26 +344,106 @@ class NIMSPApi:
         combined_params = combine_params(params)
         url = f"{self.url}{'&' if combined_params else ''}{combined_params}"
 
-        try:
-            response = requests.get(url)
+        active_params = self.get_active_params(url)
+        raw = (
+            self.cache.get(active_params, self.last_updated) if self.cache else None
+        )
+        cached = raw is not None
 
-        except:
-            return NIMSPJson({}), {}
-
-        active_params = self.get_active_params(response.url)
+        if not cached:
+            response = self.request(url)
+            active_params = self.get_active_params(response.url)
+            raw = response.content
 
         try:
-            data = json.loads(response.text)
-            # Parameters may be used for reporting
-            return NIMSPJson(data), active_params
-
-        except json.decoder.JSONDecodeError:
-            return NIMSPJson({}), active_params
+            # The body is kept as received, so that it can be stored as is
+            nimsp_json = NIMSPJson(json.loads(raw), raw=raw)
+        except ValueError:
+            nimsp_json = NIMSPJson({})
+
+        # A blank page is how the API tends to tell that it is overwhelmed
+        if self.limiter and not cached and nimsp_json.is_blank:
+            self.limiter.slow_down()
+
+        # Blank pages are not worth keeping
+        if self.cache and not cached and not nimsp_json.is_blank:
+            self.cache.put(
+                self.get_active_params(url),
+                raw,
+                nimsp_json.meta_info.reports.last_updated,
+            )
+
+        # Parameters may be used for reporting
+        return nimsp_json, active_params
+
+    def wait(self, attempt: int):
+        """Exponential backoff with full jitter before the next attempt"""
+        delay = min(self.backoff_max, self.backoff * 2**attempt)
+        time.sleep(random.uniform(0, delay))
+
+    def request(self, url: str) -> requests.Response:
+        """Sends the request through the session, retrying transient failures"""
+
+        start = time.perf_counter()
+        waiting = 0.0
+        attempt = 0
+
+        while True:
+            if self.limiter:
+                waiting += self.limiter.acquire()
+
+            throttled = False
+            try:
+                response = self.session.get(url, timeout=self.TIMEOUT)
+                throttled = response.status_code == 429
+
+                if response.status_code not in self.RETRY_STATUS:
+                    response.raise_for_status()
+                    break
+
+                error = requests.HTTPError(
+                    f"{response.status_code} returned for {response.url}",
+                    response=response,
+                )
+
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            finally:
+                if self.limiter:
+                    self.limiter.release(throttled)
+
+            if attempt >= self.retries:
+                self.stats.add(
+                    retries=attempt,
+                    failures=1,
+                    seconds=time.perf_counter() - start,
+                    waiting=waiting,
+                )
+                raise error
+
+            backoff_start = time.perf_counter()
+            self.wait(attempt)
+            waiting += time.perf_counter() - backoff_start
+            attempt += 1
+
+        # Content-Length is the size on the wire, before decompression
+        size = int(response.headers.get("Content-Length") or len(response.content))
+        self.stats.add(
+            retries=attempt,
+            size=size,
+            seconds=time.perf_counter() - start,
+            waiting=waiting,
+        )
+
+        return response
 
 
 class JSONObject:
     """JSON mapping into python object for data extraction from Web APIs"""
 
+    __slots__ = ("__data",)
+
     def __init__(self, data: dict):
         self.__data = data
 
@@ -142,21 +472,36 @@ class JSONObject:
 class NIMSPJson(JSONObject):
     """Root of the JSON produce from NIMSP APIs"""
 
-    def __init__(self, data: dict):
+    __slots__ = ("__root", "__parsed", "raw")
+
+    def __init__(self, data: dict, raw: bytes = None):
         super().__init__(data)
         self.__root = data
+        self.__parsed = {}
+        self.raw = raw
 
     @property
     def root(self) -> dict:
         return self.__root
 
+    @property
+    def is_blank(self) -> bool:
+        """The API sometimes returns a page without any meta information"""
+        return self.root.get("metaInfo") is None
+
+    def parse(self, wrapper: type):
+        """Wraps the root only once, the same object is returned afterwards"""
+        if wrapper not in self.__parsed:
+            self.__parsed[wrapper] = wrapper(self.root)
+        return self.__parsed[wrapper]
+
     @property
     def meta_info(self):
-        return MetaInfo(self.root)
+        return self.parse(MetaInfo)
 
     @property
     def records(self):
-        return Records(self.root)
+        return self.parse(Records)
 
     def export_root(self, filepath):
         with open(filepath, "w") as f:
@@ -166,6 +511,8 @@ class NIMSPJson(JSONObject):
 class MetaInfo(NIMSPJson):
     """Second to records, this will provide information about the records itself"""
 
+    __slots__ = ()
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.data = self.get("metaInfo")
@@ -176,28 +523,30 @@ class MetaInfo(NIMSPJson):
 
     @property
     def reports(self):
-        return Reports(self.root)
+        return self.parse(Reports)
 
     @property
     def pages(self):
-        return Pages(self.root)
+        return self.parse(Pages)
 
     @property
     def grouping(self):
-        return Grouping(self.root)
+        return self.parse(Grouping)
 
     @property
     def sorting(self):
-        return Sorting(self.root)
+        return self.parse(Sorting)
 
     @property
     def record_format(self) -> dict:
-        return RecordFormat(self.root)
+        return self.parse(RecordFormat)
 
 
 class Reports(MetaInfo):
     """This contains all the records in the JSON"""
 
+    __slots__ = ()
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.data = self.get("completeness")
@@ -236,6 +585,8 @@ class Reports(MetaInfo):
 class Pages(MetaInfo):
     """Desribe the structure of each page from the API call"""
 
+    __slots__ = ()
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.data = self.get("paging")
@@ -276,6 +627,8 @@ class Pages(MetaInfo):
 class Grouping(MetaInfo):
     """Data generated by the API has a grouping by default"""
 
+    __slots__ = ()
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.data = self.get("grouping")
@@ -296,6 +649,8 @@ class Grouping(MetaInfo):
 class Sorting(MetaInfo):
     """Data generated by the API can be sorted by the token name"""
 
+    __slots__ = ()
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.data = self.get("sorting")
@@ -320,6 +675,8 @@ class Sorting(MetaInfo):
 class RecordFormat(MetaInfo):
     """Describes the structure for each record"""
 
+    __slots__ = ("ignore",)
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.data = self.get("recordFormat")
@@ -341,6 +698,8 @@ class Tag(JSONObject):
     contains the token, id and value.
     """
 
+    __slots__ = ("__name",)
+
     def __init__(self, data: dict, name) -> None:
         super().__init__(data)
         self.__name = name
@@ -365,6 +724,8 @@ class Tag(JSONObject):
 class Record(JSONObject):
     """A single record generated by the API"""
 
+    __slots__ = ("ignore",)
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.ignore = [
@@ -392,10 +753,15 @@ class Record(JSONObject):
 class Records(NIMSPJson):
     """Contains multiple records"""
 
+    __slots__ = ("__all",)
+
     def __init__(self, data: dict):
         super().__init__(data)
         self.data = self.get("records")
+        self.__all = None
 
     @property
     def all(self) -> list[Record]:
-        return [Record(record) for record in self.data]
+        if self.__all is None:
+            self.__all = [Record(record) for record in self.data]
+        return self.__all
@@ -0,0 +1,103 @@
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from datetime import datetime
+
+
+class ResponseCache:
+    """Keeps the raw responses of the NIMSP API on disk, keyed by the
+    parameters of the call. An entry is trusted for as long as its TTL, or
+    for as long as the data it holds was last updated at the same time as
+    the data on the API.
+    """
+
+    INDEX = "index.json"
+
+    def __init__(self, directory: Path, ttl: float, max_bytes: int) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(self.directory / self.INDEX, "r") as f:
+                self.__index = json.load(f)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            self.__index = {}
+
+    @staticmethod
+    def key(params: dict) -> str:
+        """The API key is left out, and the order of the parameters as well
+        as the type of their values does not matter"""
+        normalized = "&".join(
+            f"{k}={str(v).strip()}" for k, v in sorted(params.items()) if k != "APIKey"
+        )
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    @property
+    def size(self) -> int:
+        return sum(entry["size"] for entry in self.__index.values())
+
+    def is_fresh(self, entry: dict, last_updated: datetime | None) -> bool:
+        """Once it is known when the data was last updated, entries are only
+        valid if they were last updated at the same time, regardless of age"""
+        if last_updated:
+            return entry["last_updated"] == str(last_updated)
+        return time.time() - entry["created"] < self.ttl
+
+    def get(self, params: dict, last_updated: datetime = None) -> bytes | None:
+        key = self.key(params)
+
+        with self.__lock:
+            entry = self.__index.get(key)
+
+            if entry and self.is_fresh(entry, last_updated):
+                try:
+                    raw = (self.directory / f"{key}.json").read_bytes()
+                except FileNotFoundError:
+                    self.__index.pop(key)
+                else:
+                    entry["accessed"] = time.time()
+                    self.hits += 1
+                    return raw
+
+            self.misses += 1
+            return None
+
+    def put(self, params: dict, raw: bytes, last_updated: datetime | None):
+        key = self.key(params)
+
+        with self.__lock:
+            (self.directory / f"{key}.json").write_bytes(raw)
+
+            now = time.time()
+            self.__index[key] = {
+                "last_updated": str(last_updated) if last_updated else None,
+                "size": len(raw),
+                "created": now,
+                "accessed": now,
+            }
+            self.evict()
+            self.save()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits"""
+        size = self.size
+        by_access = sorted(self.__index.items(), key=lambda x: x[1]["accessed"])
+
+        for key, entry in by_access:
+            if size <= self.max_bytes:
+                break
+            (self.directory / f"{key}.json").unlink(missing_ok=True)
+            self.__index.pop(key)
+            size -= entry["size"]
+
+    def save(self):
+        with open(self.directory / self.INDEX, "w") as f:
+            json.dump(self.__index, f)
@@ -1,49 +1,133 @@
+import re
 import json
+import codecs
+import queue
+import threading
 from pathlib import Path
-from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from collections import defaultdict, deque
+from typing import Iterator
+from functools import lru_cache
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
 # External Libraries and Packages
+import requests
 from tqdm import tqdm
 
 # api.py can only be imported relatively when this module is main
-from .api import NIMSPApi, NIMSPJson
+from .api import NIMSPApi, NIMSPJson, RateLimiter, iter_records
+from .cache import ResponseCache
+from .store import COMPRESSIONS, PageStore
+from cf_etl.records import RecordBatch
 
 
-def extract_json(nimsp_json: NIMSPJson) -> defaultdict[int, dict[str, str]]:
-    """Unwrap the values in the JSON file into records"""
-    extracted = defaultdict(dict)
+MANIFEST = "manifest.json"
+CHUNK_SIZE = 64 * 1024
 
-    for record in nimsp_json.records.all:
-        # The 'Candidate' Tag is ignored, so not to be confused
-        # with Candidate Entity
-        record.ignore.append("Candidate")
-        for tag in record.all:
-            # Not Candidate but Candidate Entity, a Candidate can have many
-            # Candidate Entity, since they can hold more than one campaigns
-            if tag.name == "Candidate_Entity":
-                extracted[record.id]["NIMSP_ID"] = tag.id
-            # If we change the way we store CF data (eg. storing in a relational
-            # database), the line below may change
-            extracted[record.id][tag.name] = tag.value
+# Election states a year can be split into when no states are specified
+STATES = (
+    "AK", "AL", "AR", "AZ", "CA", "CO", "CT", "DC", "DE", "FL", "GA", "HI", "IA",
+    "ID", "IL", "IN", "KS", "KY", "LA", "MA", "MD", "ME", "MI", "MN", "MO", "MS",
+    "MT", "NC", "ND", "NE", "NH", "NJ", "NM", "NV", "NY", "OH", "OK", "OR", "PA",
+    "RI", "SC", "SD", "TN", "TX", "UT", "VA", "VT", "WA", "WI", "WV", "WY",
+)  # fmt: skip
 
-    return extracted
+# The 'Candidate' Tag is ignored, so not to be confused with Candidate Entity
+IGNORED_TAGS = ("record_id", "request", "Candidate")
 
 
-def extract_json_files(files: list[Path]):
-    """Extract from the downloaded JSON files instead"""
-    extracted = {}
+def extract_columns(nimsp_json: NIMSPJson) -> tuple[list, dict[str, list]]:
+    """Flatten the records straight from the JSON into columns, returns the
+    record ids along with the columns in the same order"""
+    records = nimsp_json.root.get("records") or []
+
+    record_ids = [record.get("record_id") for record in records]
+    columns = {}
+
+    tag_names = dict.fromkeys(
+        tag_name
+        for record in records
+        for tag_name, tag in record.items()
+        if isinstance(tag, dict) and tag_name not in IGNORED_TAGS
+    )
+
+    for tag_name in tag_names:
+        tags = [record.get(tag_name) or {} for record in records]
+        # Not Candidate but Candidate Entity, a Candidate can have many
+        # Candidate Entity, since they can hold more than one campaigns
+        if tag_name == "Candidate_Entity":
+            columns["NIMSP_ID"] = [tag.get("id") for tag in tags]
+        # If we change the way we store CF data (eg. storing in a relational
+        # database), the line below may change
+        columns[tag_name] = [tag.get(tag_name) for tag in tags]
+
+    return record_ids, columns
+
+
+def flatten_record(record: dict) -> dict[str, str]:
+    """Unwrap the values of the tags of a single record, the same way as
+    extract_columns does for a whole page"""
+    flattened = {}
+
+    for tag_name, tag in record.items():
+        if not isinstance(tag, dict) or tag_name in IGNORED_TAGS:
+            continue
+        if tag_name == "Candidate_Entity":
+            flattened["NIMSP_ID"] = tag.get("id")
+        flattened[tag_name] = tag.get(tag_name)
+
+    return flattened
+
+
+def iter_extract_records(records) -> Iterator[tuple[str, dict[str, str]]]:
+    """Yields the record id along with the flattened record, one at a time"""
+    for record in records:
+        yield record.get("record_id"), flatten_record(record)
+
 
+def iter_extract_json(nimsp_json: NIMSPJson) -> Iterator[tuple[str, dict[str, str]]]:
+    """Unwrap the values in the JSON file into records, one at a time"""
+    yield from iter_extract_records(nimsp_json.root.get("records") or [])
+
+
+def extract_json(nimsp_json: NIMSPJson) -> dict[int, dict[str, str]]:
+    """Unwrap the values in the JSON file into records"""
+    return dict(iter_extract_json(nimsp_json))
+
+
+def read_json(filepath: Path) -> NIMSPJson:
+    """Read a downloaded JSON file"""
+    with open(filepath, "r") as f:
+        return NIMSPJson(json.load(f))
+
+
+def iter_extract_json_files(files: list[Path]) -> Iterator[tuple[str, dict[str, str]]]:
+    """Extract from the downloaded JSON files instead, one record at a time
+    without reading a whole file into memory"""
     for file in files:
         with open(file, "r") as f:
-            extracted.update(extract_json(NIMSPJson(json.load(f))))
+            chunks = iter(lambda: f.read(CHUNK_SIZE), "")
+            yield from iter_extract_records(iter_records(chunks))
+
 
-    return extracted
+def iter_extract_store(store: PageStore, pages: list[int] = None):
+    """Extract from the pages kept in the store, in page order, one record at
+    a time without decompressing a whole page into memory"""
+    for page in store.pages if pages is None else pages:
+        chunks = codecs.iterdecode(store.iter_chunks(page, CHUNK_SIZE), "utf-8")
+        yield from iter_extract_records(iter_records(chunks))
 
 
-def save_json(nimsp_json: NIMSPJson, filepath: Path):
+def extract_json_files(files: list[Path]):
+    """Extract from the downloaded JSON files instead"""
+    return dict(iter_extract_json_files(files))
+
+
+def save_json(nimsp_json: NIMSPJson, filepath: Path) -> Path:
     """Save the JSON file into a .json file"""
 
-    filepath.mkdir(exist_ok=True)
+    filepath.mkdir(parents=True, exist_ok=True)
 
     last_updated = nimsp_json.meta_info.reports.last_updated
     current_page = nimsp_json.meta_info.pages.current
@@ -55,6 +139,147 @@ def save_json(nimsp_json: NIMSPJson, filepath: Path):
 
     nimsp_json.export(filepath / f"{filename}.json")
 
+    return filepath / f"{filename}.json"
+
+
+def new_manifest(nimsp_api: NIMSPApi, nimsp_json: NIMSPJson) -> dict:
+    """Describes the query being extracted, pages are added as they finish"""
+    return {
+        "params": {
+            k: str(v) for k, v in nimsp_api.params.items() if k != "APIKey"
+        },
+        "last_updated": str(nimsp_json.meta_info.reports.last_updated),
+        "pages": {},
+    }
+
+
+def load_manifest(filepath: Path) -> dict:
+    """Reads the manifest left by a previous extraction, if any"""
+    try:
+        with open(filepath / MANIFEST, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest: dict, filepath: Path):
+    """Replaces the manifest in one step, so it is never left half written"""
+    filepath.mkdir(parents=True, exist_ok=True)
+    (filepath / f"{MANIFEST}.tmp").write_text(json.dumps(manifest, indent=4))
+    (filepath / f"{MANIFEST}.tmp").replace(filepath / MANIFEST)
+
+
+def resume_manifest(manifest: dict, filepath: Path) -> dict:
+    """Takes over the finished pages of a previous extraction of the same
+    query, as long as the data has not been updated since"""
+    previous = load_manifest(filepath)
+
+    if (
+        previous.get("params") != manifest["params"]
+        or previous.get("last_updated") != manifest["last_updated"]
+    ):
+        print("No previous extraction of the same data to resume from.")
+        return manifest
+
+    manifest["pages"] = {
+        page: finished
+        for page, finished in previous["pages"].items()
+        if (filepath / finished["file"]).exists()
+    }
+    print(f"Resuming with {len(manifest['pages'])} page(s) already extracted.")
+
+    return manifest
+
+
+def load_snapshot(filepath: Path) -> dict:
+    """Reads the records and watermark kept from previous extractions"""
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return {}
+
+
+def save_snapshot(snapshot: dict, filepath: Path):
+    """Replaces the snapshot in one step, so it is never left half written"""
+    filepath.with_suffix(".tmp").write_text(json.dumps(snapshot))
+    filepath.with_suffix(".tmp").replace(filepath)
+
+
+def bounded_map(executor: Executor, func, items, ahead: int):
+    """Like executor.map, results are yielded in order, but only so many
+    items are submitted ahead of the result being consumed"""
+    items = iter(items)
+    pending = deque(executor.submit(func, item) for item in islice(items, ahead))
+
+    while pending:
+        result = pending.popleft().result()
+        for item in islice(items, 1):
+            pending.append(executor.submit(func, item))
+        yield result
+
+
+def fetch_page(nimsp_api: NIMSPApi, page: int) -> tuple[int, NIMSPJson]:
+    """Requests a single page of the current query, a page that could not be
+    requested is returned blank so that it can be requested again later"""
+    try:
+        nimsp_json, _ = nimsp_api.make_call({"p": page})
+    except requests.RequestException as e:
+        print(f"Page {page} failed: {e}")
+        nimsp_json = NIMSPJson({})
+    return page, nimsp_json
+
+
+def fetch_first_page(nimsp_api: NIMSPApi, retries: int) -> tuple[NIMSPJson, dict]:
+    """Requests the first page of the current query, which gives away how
+    many pages there are. A blank or failed first page is requested again
+    with the same backoff as any other page."""
+    for attempt in range(retries + 1):
+        if attempt:
+            nimsp_api.wait(attempt - 1)
+
+        try:
+            nimsp_json, params = nimsp_api.make_call()
+        except requests.RequestException as e:
+            print(f"Page 1 failed: {e}")
+            continue
+
+        if not nimsp_json.is_blank:
+            return nimsp_json, params
+
+    query = ", ".join(
+        f"{name}={value}"
+        for name, value in nimsp_api.params.items()
+        if name not in ("APIKey", "mode")
+    )
+    raise RuntimeError(
+        f"The first page of the query ({query}) was blank or failed after "
+        f"{retries} retries, nothing can be extracted without it."
+    )
+
+
+def get_completeness_report(manifest: dict, expected: dict[int, int]) -> dict:
+    """Compares the records received for each page with the records expected"""
+    received = {int(page): entry["records"] for page, entry in manifest["pages"].items()}
+    incomplete = {
+        page: f"{received.get(page, 0)} of {n} record(s)"
+        for page, n in sorted(expected.items())
+        if received.get(page, 0) < n
+    }
+
+    d = {
+        "Pages Complete": [f"{len(expected) - len(incomplete)} of {len(expected)}"],
+        "Records Received": [
+            f"{sum(received.get(page, 0) for page in expected)}"
+            f" of {sum(expected.values())}"
+        ],
+    }
+
+    if incomplete:
+        d["Incomplete Pages"] = [f"{page}: {n}" for page, n in incomplete.items()]
+
+    return d
+
 
 def get_api_report(nimsp_api: NIMSPApi, nimsp_json: NIMSPJson, params: dict):
     """Provides the information about the extraction from the API wrapper"""
@@ -95,21 +320,112 @@ def get_api_report(nimsp_api: NIMSPApi, nimsp_json: NIMSPJson, params: dict):
     return d
 
 
-def main(api_key, year: int, export_path: Path, json_path: Path = None) -> dict:
-
-    if json_path:
-        json_files = filter(
-            lambda f: f.name.endswith(".json"),
-            (export_path / json_path).iterdir(),
+def page_number(file: Path) -> int | None:
+    """The page number in the name of a saved JSON file"""
+    match = re.search(r"_page-(\d+)_", file.name)
+    return int(match.group(1)) if match else None
+
+
+def list_saved_pages(directory: Path) -> list[tuple[Path, int | None]]:
+    """Every page saved in the directory, or in the directories of every
+    shard within it, in page order. A page is either a JSON file or a page
+    number in the store of the directory."""
+    saved_pages = []
+    shard_dirs = sorted(d for d in directory.iterdir() if d.is_dir())
+
+    if PageStore.exists(directory):
+        saved_pages.extend((directory, page) for page in PageStore(directory).pages)
+    else:
+        json_files = [
+            f
+            for f in directory.iterdir()
+            if f.name.endswith(".json") and f.name != MANIFEST
+        ]
+        # Files without a page number are read last, by their name
+        json_files.sort(
+            key=lambda f: (page_number(f) is None, page_number(f) or 0, f.name)
         )
-        records_extracted = extract_json_files(
-            sorted(json_files, key=lambda x: x.stat().st_ctime)
+        saved_pages.extend((f, None) for f in json_files)
+
+    # The pages of a single query would be read along with the same pages
+    # extracted again by shards
+    if saved_pages and shard_dirs:
+        raise ValueError(
+            f"{directory} holds both the pages of a single extraction and the"
+            " directories of shards, read either one on its own."
         )
-        return records_extracted
 
-    NIMSPApi.API_KEY = api_key
+    for shard_dir in shard_dirs:
+        saved_pages.extend(list_saved_pages(shard_dir))
+
+    return saved_pages
+
+
+@lru_cache(maxsize=32)
+def open_store_version(directory: Path, mtime: int, size: int) -> PageStore:
+    return PageStore(directory)
+
+
+def open_store(directory: Path) -> PageStore:
+    """Each worker reads the index of a store only once, unless the index
+    has changed since it was read"""
+    index = (directory / PageStore.INDEX).stat()
+    return open_store_version(directory, index.st_mtime_ns, index.st_size)
 
-    api_nimsp = NIMSPApi()
+
+def extract_saved_page(location: Path, page: int | None) -> RecordBatch:
+    """Extract from a single saved page, see list_saved_pages"""
+    if page is None:
+        return RecordBatch.from_records(extract_json_files([location]))
+    return RecordBatch.from_records(
+        dict(iter_extract_store(open_store(location), [page]))
+    )
+
+
+def extract_directory(directory: Path, workers: int = 1) -> RecordBatch:
+    """Extract from the pages saved in the directory, parsed across
+    processes and merged in page order. A record saved in more than one page
+    is kept as it was saved last."""
+    saved_pages = list_saved_pages(directory)
+    locations = [location for location, _ in saved_pages]
+    pages = [page for _, page in saved_pages]
+
+    if workers <= 1:
+        extracted = list(map(extract_saved_page, locations, pages))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            extracted = list(
+                executor.map(extract_saved_page, locations, pages, chunksize=4)
+            )
+
+    return RecordBatch.concat(extracted).drop_duplicates()
+
+
+def extract_shard(
+    year,
+    state: str,
+    json_dir: Path,
+    export_path: Path,
+    cache: ResponseCache = None,
+    limiter: RateLimiter = None,
+    workers: int = 1,
+    retries: int = 3,
+    backoff: float = 0.5,
+    resume: bool = False,
+    incremental: bool = False,
+    page_format: str = "gzip",
+    position: int = None,
+) -> RecordBatch:
+    """Extracts the candidates of a single election year, and of a single
+    election state if given"""
+
+    api_nimsp = NIMSPApi(
+        retries=retries,
+        backoff=backoff,
+        pool_size=workers,
+        cache=cache,
+        limiter=limiter,
+    )
 
     # Group by candidate, sorts by state, office in an ascending order
     api_nimsp.build(
@@ -121,43 +437,314 @@ def main(api_key, year: int, export_path: Path, json_path: Path = None) -> dict:
         }
     )
 
-    nimsp_json, params = api_nimsp.make_call()
+    if state:
+        api_nimsp.build({"s": state})
 
-    api_report = get_api_report(api_nimsp, nimsp_json, params)
+    snapshot_file = export_path / (
+        f"NIMSP-Snapshot_{year}{f'-{state}' if state else ''}.json"
+    )
+    snapshot = load_snapshot(snapshot_file) if incremental else {}
+    watermark = snapshot.get("watermark")
+
+    # Only ask for the records that have been updated since the last
+    # extraction, from the day of the watermark so nothing falls in between
+    if watermark:
+        since = datetime.strptime(watermark, "%Y-%m-%d %H:%M:%S")
+        api_nimsp.build(
+            {"d-ludte": f"{since:%Y-%m-%d},{datetime.now():%Y-%m-%d}"}
+        )
+        json_dir = json_dir.with_name(f"{json_dir.name}_since-{since:%Y-%m-%d}")
 
-    for name, l in api_report.items():
-        print(f"\033[1m\n{name}:\033[0m")
-        for value in l:
-            print(f"{' '*4}{value}")
-    print()
+    nimsp_json, params = fetch_first_page(api_nimsp, retries)
+    last_updated = nimsp_json.meta_info.reports.last_updated
 
-    records_extracted = {}
+    # Cached pages are only reused if the data has not been updated since
+    api_nimsp.last_updated = last_updated
 
-    p_bar = tqdm(total=nimsp_json.meta_info.pages.total, desc="Extracting...")
-    last_page = nimsp_json.meta_info.pages.last
+    # Reports of shards running alongside each other would be interleaved
+    if position is None:
+        api_report = get_api_report(api_nimsp, nimsp_json, params)
+
+        for name, l in api_report.items():
+            print(f"\033[1m\n{name}:\033[0m")
+            for value in l:
+                print(f"{' '*4}{value}")
+        print()
+
+    # Pages are appended as received to a single store, unless they are
+    # asked to be exported as individual JSON files
+    store = PageStore(
+        json_dir, page_format if page_format in COMPRESSIONS else "gzip"
+    )
+
+    manifest = new_manifest(api_nimsp, nimsp_json)
+    if resume:
+        manifest = resume_manifest(manifest, json_dir)
 
-    while True:
+    # Only a resumed extraction of the same data carries on with the pages
+    # already stored, otherwise they are from another query or older data
+    if not manifest["pages"]:
+        store.clear()
+    finished = manifest["pages"]
 
-        # Sometimes the API call returns a blank page, will have to catch that and
-        # move on to the next.
-        if str(nimsp_json.meta_info) != "null":
-            if nimsp_json.meta_info.pages.current <= nimsp_json.meta_info.pages.last:
+    extracted_by_page = {}
+
+    p_bar = tqdm(
+        total=nimsp_json.meta_info.pages.total,
+        desc="Extracting..." if position is None else f"Extracting {json_dir.name}...",
+        position=position,
+    )
+    current_page = nimsp_json.meta_info.pages.current
+    last_page = nimsp_json.meta_info.pages.last
 
-                records_extracted.update(extract_json(nimsp_json))
-                save_json(nimsp_json, filepath=export_path / "JSON_FILES")
+    # Every page is full except for the last one
+    per_page = nimsp_json.meta_info.pages.records
+    total_records = nimsp_json.meta_info.pages.total_records
+    expected = {
+        page: max(0, min(per_page, total_records - (page - current_page) * per_page))
+        for page in range(current_page, last_page + 1)
+    }
 
+    persist_queue = queue.Queue(maxsize=2 * max(1, workers))
+    persist_errors = []
+
+    # Writing pages to disk runs alongside requesting and parsing them, and
+    # keeps a record of every page that finished cleanly, so that an
+    # interrupted extraction can be resumed
+    def persist_pages():
+        while (item := persist_queue.get()) is not None:
+            # Pages are still taken off the queue after a failure, so that
+            # the pages being parsed are never held up
+            if persist_errors:
+                continue
+
+            page, nimsp_json, n_records = item
+            try:
+                if page_format in COMPRESSIONS and nimsp_json.raw is not None:
+                    store.append(page, nimsp_json.raw, last_updated)
+                    filename = PageStore.DATA
+                else:
+                    filename = save_json(nimsp_json, filepath=json_dir).name
+
+                finished[str(page)] = {"file": filename, "records": n_records}
+                save_manifest(manifest, json_dir)
+
+            except Exception as e:
+                persist_errors.append(e)
+
+    def add_page(page: int, nimsp_json: NIMSPJson):
+        record_ids, columns = extract_columns(nimsp_json)
+        extracted = RecordBatch.from_columns(columns, record_ids)
+        extracted_by_page[page] = extracted
+        persist_queue.put((page, nimsp_json, len(extracted)))
+
+    pages = range(current_page + 1, last_page + 1)
+    resumed = set(finished)
+    missing = [page for page in pages if str(page) not in resumed]
+    retry_queue = []
+
+    persister = threading.Thread(target=persist_pages, daemon=True)
+    persister.start()
+
+    add_page(current_page, nimsp_json)
+    p_bar.update(1)
+
+    # Pages already parsed are still written to disk if anything fails
+    try:
+        # The first call has given away the total number of pages, the rest
+        # can be requested concurrently. Results are yielded in page order, and
+        # only so many pages are requested ahead of the ones being parsed.
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            fetched = bounded_map(
+                executor,
+                lambda p: fetch_page(api_nimsp, p),
+                missing,
+                ahead=2 * max(1, workers),
+            )
+
+            for page in pages:
                 p_bar.update(1)
-                nimsp_json, params = api_nimsp.make_call(
-                    {"p": nimsp_json.meta_info.pages.current + 1}
+
+                if str(page) in resumed:
+                    filename = finished[str(page)]["file"]
+                    extracted_by_page[page] = RecordBatch.from_records(
+                        dict(
+                            iter_extract_store(store, [page])
+                            if filename == PageStore.DATA
+                            else iter_extract_json_files([json_dir / filename])
+                        )
+                    )
+                    continue
+
+                _, nimsp_json = next(fetched)
+
+                # Sometimes the API call returns a blank page, or the call fails
+                # altogether, those pages are requested again at the end
+                if nimsp_json.is_blank:
+                    retry_queue.append(page)
+                    continue
+
+                add_page(page, nimsp_json)
+
+            for attempt in range(retries):
+                if not retry_queue:
+                    break
+
+                api_nimsp.wait(attempt)
+                fetched = bounded_map(
+                    executor,
+                    lambda p: fetch_page(api_nimsp, p),
+                    retry_queue,
+                    ahead=2 * max(1, workers),
                 )
-            else:
-                break
-        else:
-            # Uses the progress bar current iteration to check with the last page
-            if p_bar.n < last_page:
-                nimsp_json, params = api_nimsp.make_call({"p": p_bar.n + 1})
-                p_bar.update(1)
-            else:
-                break
+                retry_queue = []
+
+                for page, nimsp_json in fetched:
+                    if nimsp_json.is_blank:
+                        retry_queue.append(page)
+                    else:
+                        add_page(page, nimsp_json)
+
+    finally:
+        persist_queue.put(None)
+        persister.join()
+
+    if persist_errors:
+        raise persist_errors[0]
+
+    p_bar.close()
+
+    # Pages requested again are put back in their place, a record that moved
+    # between pages while they were requested is kept as it was last seen
+    records_extracted = RecordBatch.concat(
+        [extracted_by_page[page] for page in sorted(extracted_by_page)]
+    ).drop_duplicates()
+
+    manifest["missing"] = retry_queue
+    save_manifest(manifest, json_dir)
+
+    for name, l in get_completeness_report(manifest, expected).items():
+        print(f"\033[1m{name}:\033[0m")
+        for value in l:
+            print(f"{' '*4}{value}")
+
+    if incremental:
+        print(
+            f"{len(records_extracted)} record(s) updated"
+            f"{f' since {watermark}' if watermark else ''}."
+        )
+
+        # Updated records replace the ones in the snapshot by record_id, kept
+        # as strings the way the snapshot has them once saved as JSON
+        records_snapshot = {
+            str(record_id): record
+            for record_id, record in snapshot.get("records", {}).items()
+        }
+        records_snapshot.update(
+            (str(record_id), record)
+            for record_id, record in records_extracted.to_records(fill=None).items()
+        )
+        save_snapshot(
+            {
+                "watermark": str(last_updated) if last_updated else watermark,
+                "records": records_snapshot,
+            },
+            snapshot_file,
+        )
+        records_extracted = RecordBatch.from_records(records_snapshot)
+
+    if position is None:
+        for name, l in api_nimsp.stats.report().items():
+            print(f"\033[1m{name}:\033[0m {l[0]}")
+
+    return records_extracted
+
+
+def main(
+    api_key,
+    years: list,
+    export_path: Path,
+    json_path: Path = None,
+    states: list[str] = None,
+    shard_workers: int = 1,
+    workers: int = 1,
+    rate: float = 5,
+    cache_ttl: float = 24,
+    cache_size: int = 500,
+    **shard_options,
+) -> RecordBatch:
+
+    if json_path:
+        return extract_directory(export_path / json_path, workers)
+
+    NIMSPApi.API_KEY = api_key
+
+    # TTL is given in hours and size in megabytes, a TTL of zero skips the cache
+    cache = (
+        ResponseCache(
+            export_path / "API_CACHE",
+            ttl=cache_ttl * 3600,
+            max_bytes=cache_size * 1024**2,
+        )
+        if cache_ttl > 0
+        else None
+    )
+
+    # Every shard shares the same API key, and so the same quota
+    limiter = RateLimiter(rate, concurrency=max(1, shard_workers) * max(1, workers))
+
+    # An empty list of states splits the year into every state
+    if states == []:
+        states = STATES
+
+    # Every election year and state is extracted as its own query, a single
+    # query keeps the directory used before the extraction was split. Shards
+    # are kept apart from it so neither is read along with the other.
+    shards = [(year, state) for year in years for state in states or [None]]
+
+    if len(shards) == 1:
+        year, state = shards[0]
+        records_extracted = extract_shard(
+            year,
+            state,
+            export_path / "JSON_FILES",
+            export_path,
+            cache=cache,
+            limiter=limiter,
+            workers=workers,
+            **shard_options,
+        )
+
+    else:
+
+        def extract_nth_shard(n: int):
+            year, state = shards[n]
+            shard_name = f"{year}-{state}" if state else str(year)
+            return extract_shard(
+                year,
+                state,
+                export_path / "JSON_SHARDS" / shard_name,
+                export_path,
+                cache=cache,
+                limiter=limiter,
+                workers=workers,
+                position=n,
+                **shard_options,
+            )
+
+        # Shards are merged in the order they were asked for, a record found
+        # by more than one shard is kept as the last shard has it
+        with ThreadPoolExecutor(max_workers=max(1, shard_workers)) as executor:
+            records_extracted = RecordBatch.concat(
+                list(executor.map(extract_nth_shard, range(len(shards))))
+            ).drop_duplicates()
+
+    for name, l in limiter.report().items():
+        print(f"\033[1m{name}:\033[0m {l[0]}")
+
+    if cache:
+        cache.save()
+        print(f"\033[1mCache Hits:\033[0m {cache.hits}")
+        print(f"\033[1mCache Misses:\033[0m {cache.misses}")
 
     return records_extracted
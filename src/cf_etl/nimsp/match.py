@@ -10,31 +10,70 @@ from tqdm import tqdm
 
 from record_matcher.matcher import RecordMatcher
 
+from cf_etl.records import RecordBatch
+from cf_etl.blocking import BLOCK, STATE_BLOCKING, match_blocked
+from cf_etl.scoring import BlockScores, column_pairs
 
-def match(
-    records_transformed: dict[int, dict[str, str]],
-    records_ec: dict[int, dict[str, str]],
-):
+
+# Columns that are the same, or take only a few values, within a block
+SCORED_EACH_PAIR = ("state_id", "district", "office", "party")
+
+
+def match_pass(records_transformed: RecordBatch, records_ec: RecordBatch) -> dict:
     """Configures the matching program and matches nimsp candidates with Vote
-    Smart's candidates to get the candidate_id"""
+    Smart's candidates to get the candidate_id, only candidates in the same
+    block are compared"""
 
     rc_matcher = RecordMatcher()
     rc_config = rc_matcher.config
 
-    rc_matcher.x_records = records_transformed
-    rc_matcher.y_records = records_ec
+    # The matcher compares a single record against another at a time
+    rc_matcher.x_records = records_transformed.to_records()
+    rc_matcher.y_records = records_ec.to_records()
+
+    # Pairs of values compared within a block are scored a block at a time,
+    # the matcher only looks the scores up
+    block_scores = BlockScores(scorer=fuzz.WRatio)
 
     rc_config.scorers_by_column.SCORERS.update(
-        {"WRatio": lambda x, y: fuzz.WRatio(str(x).lower(), str(y).lower())}
+        {
+            "WRatio": block_scores,
+            "WRatio Each Pair": lambda x, y: fuzz.WRatio(
+                str(x).lower(), str(y).lower()
+            ),
+        }
     )
     rc_config.scorers_by_column.default = "WRatio"
     rc_config.thresholds_by_column.default = 85
 
     rc_config.populate()
 
+    # Blocks are only grouped by, they are not compared
+    rc_config.columns_to_match.pop(BLOCK, None)
+
+    # First names are also matched with nicknames and middle names
     rc_config.columns_to_match["firstname"] = "nickname", "middlename"
 
-    rc_config.columns_to_group["state_id"] = "state_id"
+    # Columns with only a few values within a block are scored as compared,
+    # the rest are scored a block at a time
+    for column in SCORED_EACH_PAIR:
+        rc_config.scorers_by_column[column] = "WRatio Each Pair"
+
+    block_scores.add_records(
+        records_transformed,
+        records_ec,
+        column_pairs(
+            records_transformed,
+            records_ec,
+            {
+                column: columns
+                for column, columns in rc_config.columns_to_match.items()
+                if column not in SCORED_EACH_PAIR
+            },
+        ),
+    )
+
+    rc_config.columns_to_group[BLOCK] = BLOCK
     rc_config.columns_to_get["candidate_id"] = "candidate_id"
 
     rc_config.thresholds_by_column["lastname"] = 88
@@ -55,31 +94,47 @@ def match(
     for k, v in match_info.items():
         print(f"{k.rjust(len(max_key_length)+4)}:", v)
 
+    print(f"\033[1mScores Looked Up:\033[0m {block_scores.hits}")
+    print(f"\033[1mScores Computed:\033[0m {block_scores.misses}")
+    print(
+        f"\033[1mBlocks Scored:\033[0m {block_scores.blocks_scored}"
+        f" of {block_scores.n_blocks}"
+    )
+
     return records_matched
 
 
+def match(
+    records_transformed: RecordBatch,
+    records_ec: RecordBatch,
+    blocking=STATE_BLOCKING,
+) -> RecordBatch:
+    """Matches the candidates a blocking pass at a time, see match_blocked"""
+    return match_blocked(records_transformed, records_ec, match_pass, blocking)
+
+
 def verify(
-    records_matched: dict[int, dict[str, str]],
-    records_finsource: dict[int, dict[str, str]],
-    col_name: str,
-):
+    records_matched: RecordBatch, records_finsource: RecordBatch, col_name: str
+) -> RecordBatch:
     """Adds addtional column to indicate if the finsource code has been
     entered for the current candidate or if it has been entered for another"""
 
     n_col_name = f"Entered for {col_name}?"
-    records_verified = records_matched.copy()
 
     code_to_candidates = defaultdict(list)
 
-    for row in records_finsource.values():
-        code = str(row["code"]).strip()
-        candidate_id = str(row["candidate_id"]).strip()
-        code_to_candidates[code].append(candidate_id)
+    for code, candidate_id in zip(
+        records_finsource.column("code"), records_finsource.column("candidate_id")
+    ):
+        code_to_candidates[code.strip()].append(candidate_id.strip())
 
-    for row_i in records_verified.values():
+    entered_for = []
 
-        code = str(row_i[col_name]).strip()
-        candidate_id = str(row_i["candidate_id"]).strip()
+    for code, candidate_id in zip(
+        records_matched.column(col_name), records_matched.column("candidate_id")
+    ):
+        code = code.strip()
+        candidate_id = candidate_id.strip()
 
         if code in code_to_candidates.keys():
             candidate_ids = code_to_candidates[code]
@@ -88,27 +143,29 @@ def verify(
             other_entries = [cid for cid in candidate_ids if cid != candidate_id]
 
             if entered and not other_entries:
-                row_i[n_col_name] = "YES"
+                entered_for.append("YES")
 
             else:
-                row_i[n_col_name] = f"Entered for {', '.join(entered + other_entries)}"
+                entered_for.append(f"Entered for {', '.join(entered + other_entries)}")
 
         else:
-            row_i[n_col_name] = "NO"
+            entered_for.append("NO")
+
+    records_verified = records_matched.with_column(n_col_name, entered_for)
 
     return records_verified
 
 
-def query_as_records(query: str, connection, **params):
+def query_as_records(query: str, connection, **params) -> RecordBatch:
     """Converts query results into records"""
     cursor = connection.cursor()
-    #  
     # print(cursor.mogrify(query, params))
     cursor.execute(query, params)
     headers = [str(k[0]) for k in cursor.description]
-    return {
-        index: dict(zip(headers, row)) for index, row in enumerate(cursor.fetchall())
-    }
+    rows = cursor.fetchall()
+    return RecordBatch.from_columns(
+        {header: [row[i] for row in rows] for i, header in enumerate(headers)}
+    )
 
 
 def query_as_reference(query: str, connection, **params) -> dict[str, int]:
@@ -127,7 +184,11 @@ def load_query_string(query_filename):
     return query_string
 
 
-def main(records_transformed: dict, db_connection_info: dict):
+def main(
+    records_transformed: RecordBatch,
+    db_connection_info: dict,
+    blocking=STATE_BLOCKING,
+) -> tuple[RecordBatch, RecordBatch]:
 
     print("Connecting to database...")
     vsdb_conn = psycopg.connect(**db_connection_info, cursor_factory=ClientCursor)
@@ -144,8 +205,8 @@ def main(records_transformed: dict, db_connection_info: dict):
     query_offices = load_query_string("office_list")
 
     # Match Candidates
-    election_years = {str(row["election_year"]) for row in records_transformed.values()}
-    states = {str(row["state_id"]) for row in records_transformed.values()}
+    election_years = set(records_transformed.column("election_year"))
+    states = set(records_transformed.column("state_id"))
 
     print("Querying election_candidates...")
 
@@ -158,7 +219,9 @@ def main(records_transformed: dict, db_connection_info: dict):
         state_ids=list(states),
     )
 
-    records_matched = match(records_transformed, records_election_candidates)
+    records_matched = match(
+        records_transformed, records_election_candidates, blocking
+    )
 
     print("Querying finsource_candidates...")
 
@@ -167,7 +230,7 @@ def main(records_transformed: dict, db_connection_info: dict):
         query_finsource_candidates,
         vsdb_conn,
         finsource_ids=["4"],
-        finsource_codes=[f'%{row["NIMSP_ID"]}%' for row in records_matched.values()],
+        finsource_codes=[f"%{code}%" for code in records_matched.column("NIMSP_ID")],
     )
 
     records_verified = verify(records_matched, records_finsource_candidates, "NIMSP_ID")
@@ -0,0 +1,178 @@
+import gzip
+import json
+import zlib
+from pathlib import Path
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterator
+
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+# Pages are read back a chunk of at most this many bytes at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+@lru_cache
+def compressor(compression: str):
+    """Returns the functions to compress and decompress a page"""
+    if compression == "gzip":
+        return (lambda b: gzip.compress(b, compresslevel=6)), gzip.decompress
+
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "The 'zstandard' package is needed to store pages with zstd, "
+                "install it or use gzip instead."
+            )
+        return (
+            zstandard.ZstdCompressor().compress,
+            zstandard.ZstdDecompressor().decompress,
+        )
+
+    return (lambda b: b), (lambda b: b)
+
+
+def iter_decompressed(f, compression: str, length: int, size: int) -> Iterator[bytes]:
+    """Decompresses the page stored from where the file is at, yielding at
+    most size bytes of the page at a time"""
+    # The package is checked for in the same way as when the page was stored
+    compressor(compression)
+
+    if compression == "zstd":
+        import zstandard
+
+        # Only the frame of the page is read, not the pages after it
+        reader = zstandard.ZstdDecompressor().stream_reader(f, read_size=size)
+        while chunk := reader.read(size):
+            yield chunk
+        return
+
+    # A gzip member is decompressed up to its end, the next page is left
+    decompressor = zlib.decompressobj(wbits=31) if compression == "gzip" else None
+
+    while length > 0 and (data := f.read(min(size, length))):
+        length -= len(data)
+
+        if decompressor is None:
+            yield data
+            continue
+
+        while data:
+            chunk = decompressor.decompress(data, size)
+            data = decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+
+    if decompressor is not None and (chunk := decompressor.flush()):
+        yield chunk
+
+
+class PageStore:
+    """Pages as they were received from the API, appended one after another
+    to a single file. A line is added to the index for every page, holding
+    where the page starts, how long it is and when its data was last updated.
+
+    Only one process should be appending to a store at a time.
+    """
+
+    DATA = "pages.store"
+    INDEX = "pages.index"
+
+    def __init__(self, directory: Path, compression: str = "gzip") -> None:
+        self.directory = directory
+        self.compression = compression
+        self.__index = {}
+
+        for entry in self.read_index(directory):
+            self.__index[entry["page"]] = entry
+
+        self.__compress, _ = compressor(compression)
+
+    @classmethod
+    def exists(cls, directory: Path) -> bool:
+        return (directory / cls.INDEX).exists() and (directory / cls.DATA).exists()
+
+    @classmethod
+    def read_index(cls, directory: Path) -> list[dict]:
+        """Every line of the index, a line that was cut short is ignored"""
+        entries = []
+        try:
+            with open(directory / cls.INDEX, "r") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.decoder.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return entries
+
+    @property
+    def pages(self) -> list[int]:
+        return sorted(self.__index)
+
+    def __contains__(self, page: int) -> bool:
+        return page in self.__index
+
+    def clear(self):
+        """Removes every page, so that a new extraction does not add to the
+        pages of an earlier one"""
+        (self.directory / self.INDEX).unlink(missing_ok=True)
+        (self.directory / self.DATA).unlink(missing_ok=True)
+        self.__index = {}
+
+    def append(self, page: int, raw: bytes, last_updated: datetime | None):
+        """Writes the page at the end of the store, a page that is appended
+        again replaces the earlier one in the index"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data = self.__compress(raw)
+
+        with open(self.directory / self.DATA, "ab") as f:
+            offset = f.tell()
+            f.write(data)
+
+        entry = {
+            "page": page,
+            "offset": offset,
+            "length": len(data),
+            "compression": self.compression,
+            "last_updated": str(last_updated) if last_updated else None,
+        }
+
+        # The index is only written once the page is in the store
+        with open(self.directory / self.INDEX, "a") as f:
+            f.write(f"{json.dumps(entry)}\n")
+
+        self.__index[page] = entry
+
+    def read(self, page: int) -> bytes:
+        """Seeks to a single page and returns it as it was received"""
+        entry = self.__index[page]
+        _, decompress = compressor(entry["compression"])
+
+        with open(self.directory / self.DATA, "rb") as f:
+            f.seek(entry["offset"])
+            return decompress(f.read(entry["length"]))
+
+    def iter_chunks(self, page: int, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yields a single page as it was received a chunk at a time, without
+        decompressing the whole page at once"""
+        entry = self.__index[page]
+
+        with open(self.directory / self.DATA, "rb") as f:
+            f.seek(entry["offset"])
+            yield from iter_decompressed(
+                f, entry["compression"], entry["length"], size
+            )
+
+    def iter_pages(self):
+        """Yields every page in page order along with its page number"""
+        with open(self.directory / self.DATA, "rb") as f:
+            for page in self.pages:
+                entry = self.__index[page]
+                _, decompress = compressor(entry["compression"])
+                f.seek(entry["offset"])
+                yield page, decompress(f.read(entry["length"]))
@@ -1,10 +1,14 @@
 import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
 # External Libraries and Packages
 import pandas
-from unidecode import unidecode
+
+from cf_etl.records import STRING, RecordBatch, iter_batches
+from cf_etl.parsing import NameMemo, parse_unique, to_ascii
 
 
 NIMSP_ID = "NIMSP_ID"
@@ -24,34 +28,57 @@ COLUMNS_TO_RENAME = {
     STATE: "state_id",
 }
 
-title_case = lambda x: x.title().strip() if isinstance(x, str) else x
+SUFFIX_PATTERN = re.compile(r"\b(?P<suffix>[IVX][IVX]+$|[DJMS][RS][S]?[\.]?$)")
+MIDDLENAME_PATTERN = re.compile(r"\b(?P<middlename>[A-Z]{1}$)\b")
+NICKNAME_PATTERN = re.compile(r"[\"\'\(](?P<nickname>.*?)[\"\'\)]")
+
+# What is left of the last and first names once the rest is taken out
+LASTNAME_REMOVE = re.compile(rf"{SUFFIX_PATTERN.pattern}|\(.*\)")
+FIRSTNAME_REMOVE = re.compile(
+    f"{MIDDLENAME_PATTERN.pattern}|{NICKNAME_PATTERN.pattern}"
+)
+
+OFFICE_PATTERN = re.compile(r"(?P<office>.*(?=DISTRICT)|.*(?!=DISTRICT))")
+DISTRICT_PATTERN = re.compile(r"(?P<district>(?<=DISTRICT).+)")
+
+# Records transformed at a time in batch mode
+BATCH_SIZE = 50_000
+
+title_case = lambda x: x.str.title().str.strip()
 
 
 def transform_name(series: pandas.Series) -> pandas.DataFrame:
     """Splits the name into first, middle, nick and last names"""
 
-    suffix = r"\b(?P<suffix>[IVX][IVX]+$|[DJMS][RS][S]?[\.]?$)"
-    lastname = lambda x: re.sub(rf"{suffix}|\(.*\)", "", x) if x else ""
-    middlename = r"\b(?P<middlename>[A-Z]{1}$)\b"
-    nickname = r"[\"\'\(](?P<nickname>.*?)[\"\'\)]"
-    firstname = lambda x: re.sub(f"{middlename}|{nickname}", "", x) if x else ""
-
-    series = series.apply(lambda x: unidecode(x))
+    series = to_ascii(series)
 
-    df_name_split = series.str.split(pat=", ", expand=True)
-    series_firstname = df_name_split[1].apply(firstname).rename("firstname")
-    series_middlename = df_name_split[1].str.extract(middlename)["middlename"]
-    series_lastname = df_name_split[0].apply(lastname).rename("lastname")
-    series_suffix = df_name_split[0].str.extract(suffix)["suffix"]
-    series_nickname = df_name_split[1].str.extract(nickname)["nickname"]
+    # A column for the first names even if none of the names has one
+    df_name_split = (
+        series.str.split(pat=", ", expand=True).reindex(columns=[0, 1]).astype(STRING)
+    )
+    series_firstname = (
+        df_name_split[1]
+        .str.replace(FIRSTNAME_REMOVE, "", regex=True)
+        .fillna("")
+        .rename("firstname")
+    )
+    series_middlename = df_name_split[1].str.extract(MIDDLENAME_PATTERN)["middlename"]
+    series_lastname = (
+        df_name_split[0]
+        .str.replace(LASTNAME_REMOVE, "", regex=True)
+        .fillna("")
+        .rename("lastname")
+    )
+    series_suffix = df_name_split[0].str.extract(SUFFIX_PATTERN)["suffix"]
+    series_nickname = df_name_split[1].str.extract(NICKNAME_PATTERN)["nickname"]
 
     return pandas.concat(
         [
-            series_firstname.apply(title_case),
-            series_middlename.apply(title_case),
-            series_lastname.apply(title_case),
-            series_suffix.apply(title_case),
-            series_nickname.apply(title_case),
+            title_case(series_firstname),
+            title_case(series_middlename),
+            title_case(series_lastname),
+            title_case(series_suffix),
+            title_case(series_nickname),
         ],
         axis=1,
     )
@@ -60,34 +87,37 @@ def transform_name(series: pandas.Series) -> pandas.DataFrame:
 def get_election_info(series: pandas.Series) -> pandas.DataFrame:
     """Uses regex to split series into office and district"""
 
-    office = r"(?P<office>.*(?=DISTRICT)|.*(?!=DISTRICT))"
-    district = r"(?P<district>(?<=DISTRICT).+)"
-
     df_office_split = series.str.split(pat="-", expand=True)
-    series_office = df_office_split[0].str.extract(office)["office"]
-    series_district = df_office_split[0].str.extract(district)["district"]
+    series_office = df_office_split[0].str.extract(OFFICE_PATTERN)["office"]
+    series_district = df_office_split[0].str.extract(DISTRICT_PATTERN)["district"]
 
     return pandas.concat(
         [
-            series_office.apply(title_case),
-            series_district.apply(title_case),
+            title_case(series_office),
+            title_case(series_district),
         ],
         axis=1,
     )
 
 
-def main(records_extracted: dict) -> dict:
+parse_names = NameMemo(transform_name)
+
+
+def main(records_extracted: RecordBatch, workers: int = 1) -> RecordBatch:
+
+    if workers > 1:
+        return transform_partitions(records_extracted, workers)
 
-    df = pandas.DataFrame.from_dict(records_extracted, orient="index")
+    df = records_extracted.to_frame()
 
-    df_name = transform_name(df[NAME])
-    df_info = get_election_info(df[OFFICE])
+    df_name = parse_names(df[NAME])
+    df_info = parse_unique(df[OFFICE], get_election_info)
 
     df_transformed = pandas.concat(
         [
             df_name,
             df_info,
-            df[PARTY].apply(title_case),
+            parse_unique(df[PARTY], title_case),
             df[STATE],
             df[ELECTION_YEAR],
             df[NIMSP_ID],
@@ -96,9 +126,41 @@ def main(records_extracted: dict) -> dict:
     )
 
     df_transformed.rename(columns=COLUMNS_TO_RENAME, inplace=True)
-    
-    records_transformed = (
-        df_transformed.astype(str).replace("nan", "").to_dict(orient="index")
-    )
+
+    records_transformed = RecordBatch.from_frame(df_transformed)
 
     return records_transformed
+
+
+def partition(records: RecordBatch) -> list[list[int]]:
+    """Positions of the records split by the state they are from"""
+    partitions = defaultdict(list)
+    for i, state in enumerate(records.column(STATE)):
+        partitions[state].append(i)
+
+    return list(partitions.values())
+
+
+def transform_partitions(records_extracted: RecordBatch, workers: int) -> RecordBatch:
+    """Transforms every partition of the records in a separate process, the
+    records transformed are put back in the order they were extracted"""
+    partitions = partition(records_extracted)
+
+    with ProcessPoolExecutor(workers) as executor:
+        records_transformed = RecordBatch.concat(
+            list(executor.map(main, map(records_extracted.take, partitions)))
+        )
+
+    positions = [i for positions in partitions for i in positions]
+    return records_transformed.take(
+        sorted(range(len(positions)), key=positions.__getitem__)
+    )
+
+
+def iter_main(batches, batch_size: int = BATCH_SIZE, workers: int = 1):
+    """Transforms batches of records of any size as they come in and yields
+    them transformed in batches of batch_size records, so that only a single
+    batch is held in memory at a time"""
+
+    for records_batch in iter_batches(batches, batch_size):
+        yield main(records_batch, workers)
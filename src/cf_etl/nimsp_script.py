@@ -4,44 +4,73 @@ from pathlib import Path
 from datetime import datetime
 
 # External packages and libraries
-import pandas
 from dotenv import load_dotenv
 
 # Internal packages and libraries
 if __name__ == "__main__":
+    from records import RecordBatch
+    from blocking import parse_blocking
     from nimsp.extract import main as extract
     from nimsp.transform import main as transform
+    from nimsp.transform import iter_main as iter_transform
     from nimsp.match import main as nimsp_match
 else:
+    from cf_etl.records import RecordBatch
+    from cf_etl.blocking import parse_blocking
     from cf_etl.nimsp.extract import main as extract
     from cf_etl.nimsp.transform import main as transform
+    from cf_etl.nimsp.transform import iter_main as iter_transform
     from cf_etl.nimsp.match import main as nimsp_match
 
 
-def save_records(
-    records: dict[int, dict[str, str]], filepath: Path, filename: str = None
-):
+def save_records(records: RecordBatch, filepath: Path, filename: str = None):
 
     filepath.mkdir(exist_ok=True)
 
     timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d-%H%M%S-%f")
 
-    df = pandas.DataFrame.from_dict(records, orient="index")
-    df.to_csv(
-        filepath / f"{filename if filename else 'records'}_{timestamp}.csv",
-        index=False,
+    records.to_csv(
+        filepath / f"{filename if filename else 'records'}_{timestamp}.csv"
     )
 
 
+def save_batches(batches, filepath: Path, filename: str = None):
+    """Appends every batch of records to the same file as it comes in"""
+
+    filepath.mkdir(exist_ok=True)
+
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d-%H%M%S-%f")
+    file = filepath / f"{filename if filename else 'records'}_{timestamp}.csv"
+
+    for i, records in enumerate(batches):
+        records.to_csv(file, append=bool(i))
+
+
 def main():
 
     parser = argparse.ArgumentParser(prog="campaign_finance_nimsp")
 
     parser.add_argument(
         "-y",
-        "--year",
+        "--years",
+        nargs="+",
         required=True,
-        help="election year of candidates",
+        help="election year(s) of candidates",
+    )
+
+    parser.add_argument(
+        "-s",
+        "--states",
+        nargs="*",
+        help="election state(s) to split the extraction into, every state if"
+        " none is given after the flag",
+    )
+
+    parser.add_argument(
+        "--shard_workers",
+        type=int,
+        default=1,
+        help="number of years or states extracted concurrently",
     )
 
     parser.add_argument(
@@ -59,6 +88,26 @@ def main():
         help="filepath of the JSON files to read",
     )
 
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted extraction from the JSON files",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only extract records updated since the last incremental extraction",
+    )
+
+    parser.add_argument(
+        "--page_format",
+        choices=["json", "none", "gzip", "zstd"],
+        default="gzip",
+        help="how extracted pages are saved, either as individual JSON files or"
+        " appended as received to a single store with the given compression",
+    )
+
     parser.add_argument(
         "-f",
         "--file",
@@ -66,6 +115,76 @@ def main():
         help="filepath of the spreadsheet file to read",
     )
 
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=4,
+        help="number of pages requested concurrently from the API",
+    )
+
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=5,
+        help="most requests per second sent to the API, 0 for no limit",
+    )
+
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="number of times a failed API call is retried",
+    )
+
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=0.5,
+        help="base delay in seconds between retries, doubled on every attempt",
+    )
+
+    parser.add_argument(
+        "--cache_ttl",
+        type=float,
+        default=24,
+        help="hours a cached API response is reused for, 0 disables the cache",
+    )
+
+    parser.add_argument(
+        "--cache_size",
+        type=int,
+        default=500,
+        help="megabytes of API responses kept in the cache",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--batch_size",
+        type=int,
+        help="number of records transformed at a time, with -t the spreadsheet"
+        " is also read and saved a batch at a time",
+    )
+
+    parser.add_argument(
+        "--transform_workers",
+        type=int,
+        default=1,
+        help="number of processes the records are transformed across, split by"
+        " state",
+    )
+
+    parser.add_argument(
+        "--blocking",
+        nargs="+",
+        default=["state_id"],
+        help="blocking passes candidates are matched in, a candidate is only"
+        " compared with candidates that share the values of every key of the"
+        " pass. Keys are joined by '+' and can be coded, as in"
+        " 'state_id+office' 'state_id+lastname:soundex' 'state_id+lastname:prefix3'."
+        " Candidates left without a match go on to the next pass",
+    )
+
     parser.add_argument(
         "-e",
         "--extract",
@@ -89,6 +208,11 @@ def main():
 
     args = parser.parse_args()
 
+    try:
+        blocking = parse_blocking(args.blocking)
+    except ValueError as e:
+        parser.error(str(e))
+
     package_dir = Path(__file__).parent
     load_dotenv(package_dir / "config" / ".env")
 
@@ -101,7 +225,21 @@ def main():
     }
     if not (any((args.extract, args.transform, args.match))):
         records_extracted = extract(
-            os.getenv("NIMSP_API_KEY"), args.year, args.export_path, args.json_path
+            os.getenv("NIMSP_API_KEY"),
+            args.years,
+            args.export_path,
+            args.json_path,
+            states=args.states,
+            shard_workers=args.shard_workers,
+            workers=args.workers,
+            rate=args.rate,
+            retries=args.retries,
+            backoff=args.backoff,
+            cache_ttl=args.cache_ttl,
+            cache_size=args.cache_size,
+            resume=args.resume,
+            incremental=args.incremental,
+            page_format=args.page_format,
         )
 
         print("Extracting...")
@@ -112,7 +250,17 @@ def main():
         )
 
         print("Transforming...")
-        records_transformed = transform(records_extracted)
+        if args.batch_size:
+            records_transformed = RecordBatch.concat(
+                list(
+                    iter_transform(
+                        [records_extracted], args.batch_size, args.transform_workers
+                    )
+                )
+            )
+        else:
+            records_transformed = transform(records_extracted, args.transform_workers)
+
         save_records(
             records_transformed,
             args.export_path,
@@ -121,7 +269,7 @@ def main():
 
         print("Matching...")
         records_verified, records_election_candidates = nimsp_match(
-            records_transformed, db_connection_info
+            records_transformed, db_connection_info, blocking
         )
         save_records(
             records_verified,
@@ -137,7 +285,21 @@ def main():
 
     elif args.extract and not (any((args.transform, args.match))):
         records_extracted = extract(
-            os.getenv("NIMSP_API_KEY"), args.year, args.export_path, args.json_path
+            os.getenv("NIMSP_API_KEY"),
+            args.years,
+            args.export_path,
+            args.json_path,
+            states=args.states,
+            shard_workers=args.shard_workers,
+            workers=args.workers,
+            rate=args.rate,
+            retries=args.retries,
+            backoff=args.backoff,
+            cache_ttl=args.cache_ttl,
+            cache_size=args.cache_size,
+            resume=args.resume,
+            incremental=args.incremental,
+            page_format=args.page_format,
         )
         save_records(
             records_extracted,
@@ -150,28 +312,35 @@ def main():
             parser.print_help()
             parser.error("Please specify the filepath of the spreadsheet.")
 
-        df_extracted = pandas.read_csv(args.file)
-        records_extracted = df_extracted.to_dict(orient="index")
-
-        records_transformed = transform(records_extracted)
-        save_records(
-            records_transformed,
-            args.export_path,
-            "NIMSP-Transformed",
-        )
+        if args.batch_size:
+            batches_extracted = RecordBatch.read_csv(args.file, args.batch_size)
+            save_batches(
+                iter_transform(
+                    batches_extracted, args.batch_size, args.transform_workers
+                ),
+                args.export_path,
+                "NIMSP-Transformed",
+            )
+
+        else:
+            records_extracted = RecordBatch.read_csv(args.file)
+
+            records_transformed = transform(records_extracted, args.transform_workers)
+            save_records(
+                records_transformed,
+                args.export_path,
+                "NIMSP-Transformed",
+            )
 
     elif args.match and not (any((args.extract, args.transform))):
         if not args.file:
             parser.print_help()
             parser.error("Please specify the filepath of the spreadsheet.")
 
-        df_transformed = pandas.read_csv(
-            args.file, na_values="nan", keep_default_na=False
-        )
-        records_transformed = df_transformed.to_dict(orient="index")
+        records_transformed = RecordBatch.read_csv(args.file)
 
         records_verified, records_election_candidates = nimsp_match(
-            records_transformed, db_connection_info
+            records_transformed, db_connection_info, blocking
         )
         save_records(
             records_verified,
@@ -0,0 +1,80 @@
+import re
+from collections import OrderedDict
+
+# External Libraries and Packages
+import pandas
+from unidecode import unidecode
+
+from cf_etl.records import STRING
+
+
+NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+# Most names parsed kept in memory across the files of a batch
+NAME_MEMO_SIZE = 200_000
+
+
+def to_ascii(series: pandas.Series) -> pandas.Series:
+    """Transliterates into ASCII, only values that are not ASCII already"""
+    non_ascii = series.str.contains(NON_ASCII, na=False)
+
+    if non_ascii.any():
+        series = series.copy()
+        series[non_ascii] = series[non_ascii].map(unidecode)
+
+    return series
+
+
+def parse_unique(series: pandas.Series, parse) -> pandas.DataFrame:
+    """Parses every distinct value only once and maps the results back to
+    every row that holds the value"""
+    codes, uniques = pandas.factorize(series, use_na_sentinel=False)
+    parsed = parse(pandas.Series(uniques, dtype=STRING, name=series.name))
+
+    return parsed.iloc[codes].set_axis(series.index)
+
+
+class NameMemo:
+    """Names parsed before along with how they were parsed, only names that
+    were not seen yet are parsed. Once full, the least recently seen names
+    are dropped first."""
+
+    def __init__(self, parse, size: int = NAME_MEMO_SIZE) -> None:
+        self.parse = parse
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.columns = None
+        self.__parsed = OrderedDict()
+
+    def __call__(self, series: pandas.Series) -> pandas.DataFrame:
+        codes, uniques = pandas.factorize(series, use_na_sentinel=False)
+
+        # Missing names are all kept under the same key
+        keys = [name if isinstance(name, str) else None for name in uniques]
+        unseen = [i for i, key in enumerate(keys) if key not in self.__parsed]
+
+        self.hits += len(keys) - len(unseen)
+        self.misses += len(unseen)
+
+        if unseen:
+            df_parsed = self.parse(
+                pandas.Series(uniques[unseen], dtype=STRING, name=series.name)
+            )
+            self.columns = df_parsed.columns
+            for i, row in zip(unseen, df_parsed.itertuples(index=False, name=None)):
+                self.__parsed[keys[i]] = row
+
+        rows = []
+        for key in keys:
+            self.__parsed.move_to_end(key)
+            rows.append(self.__parsed[key])
+
+        while len(self.__parsed) > self.size:
+            self.__parsed.popitem(last=False)
+
+        return (
+            pandas.DataFrame(rows, columns=self.columns, dtype=STRING)
+            .iloc[codes]
+            .set_axis(series.index)
+        )
@@ -0,0 +1,182 @@
+import math
+from pathlib import Path
+from typing import Iterator
+
+# External Libraries and Packages
+import pandas
+import pyarrow
+
+
+# Strings are kept in Arrow arrays with missing values as nulls, they only
+# become empty strings once the records are handed on
+STRING = pandas.StringDtype("pyarrow")
+
+
+def is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def to_strings(values) -> pyarrow.Array:
+    """Every value as a string, missing values are kept as nulls"""
+    return pyarrow.array(
+        [
+            None if is_missing(value) else str(value)
+            for value in values
+        ],
+        type=pyarrow.string(),
+    )
+
+
+class RecordBatch:
+    """Records held by column as Arrow strings, along with the index of every
+    record. Every stage takes and returns records this way, and records are
+    only turned into dictionaries where a single record is needed.
+    """
+
+    def __init__(self, table: pyarrow.Table, index: list = None) -> None:
+        self.table = table
+        self.index = list(range(table.num_rows)) if index is None else list(index)
+
+    @classmethod
+    def from_columns(cls, columns: dict[str, list], index: list = None):
+        """Records from a list of values for every column"""
+        table = pyarrow.table(
+            {name: to_strings(values) for name, values in columns.items()}
+        )
+        return cls(table, index if columns else [])
+
+    @classmethod
+    def from_records(cls, records: dict[int, dict[str, str]]):
+        """Records from a dictionary of records, a column is made for every
+        key found in any of the records"""
+        names = dict.fromkeys(name for record in records.values() for name in record)
+        return cls.from_columns(
+            {name: [record.get(name) for record in records.values()] for name in names},
+            list(records),
+        )
+
+    @classmethod
+    def from_frame(cls, df: pandas.DataFrame):
+        """Records from a frame, the index of the frame is kept"""
+        table = pyarrow.Table.from_pandas(
+            df.rename(columns=str).astype(STRING), preserve_index=False
+        )
+        return cls(table, df.index.tolist())
+
+    @classmethod
+    def concat(cls, batches: list, ignore_index: bool = False):
+        """Records of every batch one after another, a column missing from a
+        batch is null for its records. The records are numbered again if the
+        index of each batch is ignored."""
+        batches = [batch for batch in batches if batch.table.num_columns]
+        if not batches:
+            return cls(pyarrow.table({}), [])
+
+        return cls(
+            pyarrow.concat_tables(
+                [batch.table for batch in batches], promote_options="default"
+            ),
+            None if ignore_index else [i for batch in batches for i in batch.index],
+        )
+
+    @classmethod
+    def read_csv(cls, file: Path, batch_size: int = None):
+        """Records saved by to_csv, read as strings where only empty cells are
+        missing. Given a batch size, the batches are read one at a time."""
+        options = {"dtype": STRING, "na_values": ["", "nan"], "keep_default_na": False}
+
+        if batch_size:
+            return (
+                cls.from_frame(df)
+                for df in pandas.read_csv(file, chunksize=batch_size, **options)
+            )
+
+        return cls.from_frame(pandas.read_csv(file, **options))
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def columns(self) -> list[str]:
+        return self.table.column_names
+
+    def column(self, name: str, fill: str = "") -> list:
+        """Values of a single column, missing values are filled"""
+        values = self.table.column(name)
+        return (values.fill_null(fill) if fill is not None else values).to_pylist()
+
+    def with_column(self, name: str, values: list):
+        """A copy of the records where the column is added, or replaced if it
+        is already there"""
+        array = to_strings(values)
+        if name in self.columns:
+            i = self.columns.index(name)
+            return RecordBatch(self.table.set_column(i, name, array), self.index)
+        return RecordBatch(self.table.append_column(name, array), self.index)
+
+    def slice(self, offset: int = 0, length: int = None):
+        """A part of the records, without copying them"""
+        end = len(self) if length is None else offset + length
+        return RecordBatch(self.table.slice(offset, length), self.index[offset:end])
+
+    def take(self, positions: list[int]):
+        """The records at the given positions, in the order given"""
+        return RecordBatch(
+            self.table.take(pyarrow.array(positions, pyarrow.int64())),
+            [self.index[i] for i in positions],
+        )
+
+    def drop_duplicates(self):
+        """Only the last record of every index is kept, in the place of the
+        first, the same as updating a dictionary of records one batch after
+        another"""
+        last = {}
+        for position, i in enumerate(self.index):
+            last[i] = position
+
+        if len(last) == len(self):
+            return self
+        return self.take(list(last.values()))
+
+    def to_frame(self) -> pandas.DataFrame:
+        """A frame of Arrow strings, indexed by the index of the records"""
+        return self.table.to_pandas(
+            types_mapper={pyarrow.string(): STRING}.get
+        ).set_axis(self.index)
+
+    def to_records(self, fill: str = "") -> dict[int, dict[str, str]]:
+        """A dictionary for every record, missing values are filled"""
+        names = self.columns
+        columns = [self.column(name, fill) for name in names]
+        return {
+            index: dict(zip(names, row))
+            for index, row in zip(self.index, zip(*columns))
+        }
+
+    def to_csv(self, file: Path, append: bool = False):
+        """Saves the records without their index, missing values are left
+        empty. When appended, the header is not written again."""
+        self.to_frame().to_csv(
+            file, index=False, mode="a" if append else "w", header=not append
+        )
+
+
+def iter_batches(batches, batch_size: int) -> Iterator[RecordBatch]:
+    """Batches of any size regrouped as they come in into batches of exactly
+    batch_size records, the last batch may be smaller"""
+    pending = []
+    n_pending = 0
+
+    for batch in batches:
+        pending.append(batch)
+        n_pending += len(batch)
+
+        while n_pending >= batch_size:
+            records = RecordBatch.concat(pending)
+            yield records.slice(0, batch_size)
+
+            pending = [records.slice(batch_size)]
+            n_pending = len(pending[0])
+
+    if n_pending:
+        yield RecordBatch.concat(pending)
@@ -0,0 +1,203 @@
+from collections import OrderedDict, defaultdict
+
+# External Libraries and Packages
+import numpy
+from rapidfuzz import fuzz, process
+
+from cf_etl.records import RecordBatch
+from cf_etl.blocking import BLOCK
+
+
+# Fewest pairs of records in a block for it to be scored as a matrix
+MIN_BLOCK_PAIRS = 100
+
+# Fewest scores in a matrix for it to be scored across every core
+PARALLEL_SCORES = 10_000
+
+
+def lowered(records: RecordBatch, column: str) -> list[str]:
+    return [value.lower() for value in records.column(column)]
+
+
+def column_pairs(
+    x_records: RecordBatch, y_records: RecordBatch, columns_to_match: dict
+) -> list[tuple[str, str]]:
+    """Columns compared with the columns they are matched with, given as a
+    column or a tuple of them, along with the column itself if both records
+    have it"""
+    pairs = []
+    for x, ys in columns_to_match.items():
+        ys = (ys,) if isinstance(ys, str) else tuple(ys)
+        for y in dict.fromkeys((x, *ys)):
+            if x in x_records.columns and y in y_records.columns:
+                pairs.append((x, y))
+    return pairs
+
+
+def group_by_block(records: RecordBatch) -> dict[str, list[int]]:
+    """Positions of the records in every block"""
+    blocks = defaultdict(list)
+    for i, block in enumerate(records.column(BLOCK)):
+        blocks[block].append(i)
+    return blocks
+
+
+class BlockScores:
+    """Scores of every pair of values that can be compared within a block,
+    computed as a matrix for every column of a block in a single call across
+    every core. A block is only scored once a pair of its values is asked
+    for, and only the blocks scored last are kept.
+
+    Blocks are expected to be matched in the order they were added, so a
+    pair that is not in the blocks kept is only looked for in the block
+    after the one scored last. Every block is scored at most once, pairs of
+    blocks too small to be worth a matrix are scored as they are asked for.
+    """
+
+    def __init__(
+        self, scorer=fuzz.WRatio, workers: int = -1, blocks_kept: int = 4
+    ) -> None:
+        self.scorer = scorer
+        self.workers = workers
+        self.blocks_kept = blocks_kept
+        self.hits = 0
+        self.misses = 0
+        self.blocks_scored = 0
+
+        self.__values = {}
+        self.__order = {}
+        self.__blocks = []
+        self.__scored = OrderedDict()
+        self.__current = {}
+        self.__last = -1
+
+    @property
+    def n_blocks(self) -> int:
+        return len(self.__values)
+
+    @classmethod
+    def from_records(
+        cls,
+        x_records: RecordBatch,
+        y_records: RecordBatch,
+        column_pairs: list[tuple[str, str]],
+        scorer=fuzz.WRatio,
+        workers: int = -1,
+    ):
+        block_scores = cls(scorer, workers)
+        block_scores.add_records(x_records, y_records, column_pairs)
+        return block_scores
+
+    def add_records(
+        self,
+        x_records: RecordBatch,
+        y_records: RecordBatch,
+        column_pairs: list[tuple[str, str]],
+    ):
+        """Values of every pair of columns, compared without case, for every
+        block both records have in common, in the order the blocks first
+        appear in x_records"""
+        x_columns = {x: lowered(x_records, x) for x, _ in column_pairs}
+        y_columns = {y: lowered(y_records, y) for _, y in column_pairs}
+        y_blocks = group_by_block(y_records)
+
+        for block, x_positions in group_by_block(x_records).items():
+            # Pairs of a small block are scored quicker as they are compared
+            if len(x_positions) * len(y_blocks.get(block, ())) < MIN_BLOCK_PAIRS:
+                continue
+
+            self.add_block(
+                block,
+                {
+                    (x, y): (
+                        [x_columns[x][i] for i in x_positions],
+                        [y_columns[y][j] for j in y_blocks[block]],
+                    )
+                    for x, y in column_pairs
+                },
+            )
+
+    def add_block(self, block: str, values: dict[tuple, tuple[list, list]]):
+        """Keeps the distinct values of a column and of the column it is
+        compared with, for each pair of columns in the block"""
+        values = [
+            (dict.fromkeys(x_values), dict.fromkeys(y_values))
+            for x_values, y_values in values.values()
+            if x_values and y_values
+        ]
+
+        self.__values[block] = values
+        self.__order[block] = len(self.__blocks)
+        self.__blocks.append(block)
+
+    def score_block(self, block: str):
+        """Scores every value of a column against every value of the other,
+        for each pair of columns in the block, the block kept the longest is
+        dropped once too many are kept"""
+        scores = defaultdict(dict)
+
+        for xs, ys in self.__values[block]:
+            # Threads take longer to start than a small matrix takes to score
+            matrix = process.cdist(
+                list(xs),
+                list(ys),
+                scorer=self.scorer,
+                dtype=numpy.float64,
+                workers=self.workers if len(xs) * len(ys) >= PARALLEL_SCORES else 1,
+            )
+
+            # The same pair of values scores the same in every pair of columns
+            for x, row in zip(xs, matrix.tolist()):
+                scores[x].update(zip(ys, row))
+
+        self.__scored[block] = scores
+        self.__current = scores
+        while len(self.__scored) > self.blocks_kept:
+            self.__scored.popitem(last=False)
+
+        self.__last = self.__order[block]
+        self.blocks_scored += 1
+
+    def lookup(self, x: str, y: str) -> float | None:
+        """Score of the pair in the blocks kept other than the current one,
+        the block it is found in becomes the current one"""
+        for block in reversed(self.__scored):
+            if self.__scored[block] is self.__current:
+                continue
+            score = self.__scored[block].get(x, {}).get(y)
+            if score is not None:
+                self.__scored.move_to_end(block)
+                self.__current = self.__scored[block]
+                return score
+        return None
+
+    def next_block(self, x: str, y: str) -> str | None:
+        """The block after the one scored last, if it compares the pair"""
+        if self.__last + 1 >= len(self.__blocks):
+            return None
+
+        block = self.__blocks[self.__last + 1]
+        if any(x in xs and y in ys for xs, ys in self.__values[block]):
+            return block
+        return None
+
+    def __call__(self, x, y) -> float:
+        x = str(x).lower()
+        y = str(y).lower()
+
+        # Most pairs are in the block looked in last
+        scores = self.__current.get(x)
+        score = scores.get(y) if scores is not None else None
+
+        if score is None and self.__scored:
+            score = self.lookup(x, y)
+        if score is None and (block := self.next_block(x, y)) is not None:
+            self.score_block(block)
+            score = self.__current.get(x, {}).get(y)
+
+        if score is not None:
+            self.hits += 1
+            return score
+
+        self.misses += 1
+        return self.scorer(x, y)